@@ -1,16 +1,45 @@
+import hashlib
+import math
+import os
+import tempfile
+import time
+
 import streamlit as st
 import pandas as pd
-from docx import Document
-import re
-import io
-import zipfile
-import requests
-import json
-import time
 from streamlit_gsheets import GSheetsConnection
 
-# --- CONFIGURAÇÃO DA PÁGINA ---
-st.set_page_config(page_title="Sistema Integrado DUPAR", page_icon="📊", layout="wide")
+from cache_respostas import CacheRespostas
+from cliente_gpt import RESERVA_TOKENS_RESPOSTA, TIMEOUT_OCIOSO, LimitadorTaxa
+from motor import gravar_prompts, preparar_prompts
+from orcamento import PRECOS_POR_MILHAO, contagem_exata, contar_tokens_prompts, estimar_lote
+from planilhas import (
+    carregar_estado_ingestao,
+    carregar_planilha_mestra,
+    gravar_planilha_mestra,
+    ingerir_origem,
+    invalidar_planilha_mestra,
+    ler_origem_a_partir_de,
+    revisao_planilha,
+)
+from saida_lote import ArmazemPrompts, ZipIncremental
+from telemetria import Telemetria
+from template_prompt import TEMPLATE_PADRAO, compilar_template
+from trabalhos import (
+    CANCELADO,
+    CONCLUIDO,
+    EXECUTANDO,
+    FALHOU,
+    FINALIZADO,
+    RETENCAO_DIAS_PADRAO,
+    DiarioTrabalhos,
+    cancelamento_solicitado,
+    cancelar_trabalho,
+    em_execucao,
+    iniciar_trabalho,
+    respostas_parciais,
+    situacao_atual,
+)
+from unificador import processar_cpfs
 
 # --- CONSTANTES GLOBAIS ---
 
@@ -22,382 +51,600 @@ SHEET_ID_DESTINO = "1xny0NMN0JrpiC8cxc5b8bL2QrBwAVJJqIG8g1jty2Ps"
 URL_EXPORT_EXCEL = f"https://docs.google.com/spreadsheets/d/{SHEET_ID_DESTINO}/export?format=xlsx"
 URL_G_SHEET_LINK = f"https://docs.google.com/spreadsheets/d/{SHEET_ID_DESTINO}/edit?usp=sharing"
 
-# 3. TEMPLATE PADRÃO
-TEMPLATE_PADRAO = """Faça um relatório do modelo que estamos treinando com os seguintes itens: identificação (nome, cpf, e-mail, data do nascimento, naturalidade, objetivo de participação), registro de aplicação (identidade assistida ou nome, nome do aplicador, escolha da atividade - instrutor ou a própria pessoa, tempo dele resposta e data de aplicação, fractal de comportamento), registro de dados (fazer um quadro com as seguintes colunas e dados; numero de resposta, respostas, hierarquia e padrão de comportamento psicológico identificado), abaixo do quadro escreva um paragrafo sobre a interpretação do quadro de registro de dados, e a seguir outro paragrafo com as sugestões (habilidades a 
-desenvolver fundamentado no paragrafo da interpretação). utilize os dados a seguir: 
+# Intervalo (s) de atualização do painel enquanto um lote roda em segundo plano
+INTERVALO_ACOMPANHAMENTO = 2
+# Itens por página nos painéis de revisão: só a página visível é montada
+ITENS_POR_PAGINA = 20
 
-relatório 1: {{Horario de inicio}} {{Horario de termino}} {{Tempo de resposta}} {{Data de Aplicação}} {{Nome}} {{E-mail}} {{Naturalidade}} {{CPF}} {{Data de nascimento}} {{Objetivo}} {{Tipo de Aplicação}} {{Nome do Aplicador}}  {{Escolha da Atividade}} fractal de comportamento: 1- "{{Pergunta}}" {{RESPOSTA 1}} {{HIERAQUIA 1}} {{JUSTIFICATIVA 1}} {{RESPOSTA 2}} {{HIERAQUIA 2}} {{JUSTIFICATIVA 2}} {{RESPOSTA 3}} {{HIERAQUIA 3}} {{JUSTIFICATIVA 3}} {{FEEDBACK FINAL}}.
-
-relatório 2: {{Horario de inicio}} {{Horario de termino}} {{Tempo de resposta}} {{Data de Aplicação}} {{Nome}} {{E-mail}} {{Naturalidade}} {{CPF}} {{Data de nascimento}} {{Objetivo}} {{Tipo de Aplicação}} {{Nome do Aplicador}} {{Escolha da Atividade}} fractal de comportamento 2 - "{{Pergunta_2}}" {{RESPOSTA 1_2}} {{HIERAQUIA 1_2}} {{JUSTIFICATIVA 1_2}} {{RESPOSTA 2_2}} {{HIERAQUIA 2_2}} {{JUSTIFICATIVA 2_2}} {{RESPOSTA 3_2}} {{HIERAQUIA 3_2}} {{JUSTIFICATIVA 3_2}} {{FEEDBACK FINAL_2}}.
-
-cruze as informações levantadas e faça uma síntese em um paragrafo, dos padrões de comportamento psicológico recorrentes nas respostas dos três fractais.
-em seguida escreva um outro paragrafo de recomendação de desenvolvimento de habilidades.
-em seguida combinar as informações e categorizar como padrões de comportamento do usuário tem conteúdos definidos como: ● socialização: atributo relacionado com as interações do usuário com outros indivíduos, sejam familiares, amigos ou colegas de trabalho;
-● reflexão: atributo relacionado com a reflexão interior do usuário sobre as suas questões de vida e aspectos maiores do contexto no qual ele habita;
-● lazer: atributo relacionado com a realização de atividades que promovem o prazer e a felicidade do usuário, sejam elas ao ar livre ou em casa;
-● propósito: atributo relacionado com a motivação pessoal e os objetivos do usuário, ditando suas ambições, perspectivas de futuro e conquistas;
-● sentimento: atributo relacionado com o equilíbrio emocional do usuário e sua relação positiva com os aspectos sentimentais internos e externos;
-lazer, socialização, reflexão, propósito e sentimento numa métrica de 0 a 100%"""
 
 # ==============================================================================
-# FUNÇÕES AUXILIARES (GERADOR GPT)
+# RECURSOS COMPARTILHADOS PELO PROCESSO
 # ==============================================================================
-def ler_e_substituir_template(template_text, dados):
-    def substituir(match):
-        variavel = match.group(1).strip()
-        valor = dados.get(variavel)
-        return str(valor).strip() if valor is not None else ""
-    return re.sub(r'\{\{([^{}]+)\}\}', substituir, template_text)
-
-def formatar_paragrafo_com_negrito(paragrafo, texto):
-    partes = re.split(r'(\*\*.*?\*\*)', texto)
-    for parte in partes:
-        if parte.startswith('**') and parte.endswith('**'):
-            run = paragrafo.add_run(parte[2:-2])
-            run.bold = True
-        else:
-            paragrafo.add_run(parte)
-
-def criar_docx_bytes(texto_resposta):
-    doc = Document()
-    linhas = texto_resposta.split('\n')
-    for linha in linhas:
-        linha = linha.strip()
-        if not linha: continue
-        if linha.startswith('#'):
-            nivel = linha.count('#')
-            texto_limpo = linha.lstrip('#').strip()
-            doc.add_heading(texto_limpo, level=min(nivel, 9))
-        elif linha.startswith('- ') or linha.startswith('* '):
-            p = doc.add_paragraph(style='List Bullet')
-            texto_limpo = linha[2:]
-            formatar_paragrafo_com_negrito(p, texto_limpo)
-        else:
-            p = doc.add_paragraph()
-            formatar_paragrafo_com_negrito(p, linha)
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer.read()
-
-def chamar_gpt(api_key, prompt_text, modelo="gpt-3.5-turbo"):
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": modelo,
-        "messages": [{"role": "user", "content": prompt_text}],
-        "temperature": 0.7
-    }
-    try:
-        for tentativa in range(3):
-            try:
-                response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data, timeout=60)
-                response.raise_for_status() 
-                return response.json()['choices'][0]['message']['content']
-            except requests.exceptions.HTTPError as e:
-                if response.status_code == 429:
-                    time.sleep(2 * (tentativa + 1))
-                    continue
-                return f"Erro na API (HTTP {response.status_code}): {response.text}"
-            except Exception:
-                if tentativa == 2: raise
-                time.sleep(1)
-    except Exception as e:
-        return f"Erro fatal na conexão: {e}"
+# Criados uma vez e reaproveitados entre execuções e sessões: o __init__ cria o esquema no SQLite
+@st.cache_resource
+def obter_cache_respostas(idade_maxima_dias, tamanho_maximo_mb):
+    return CacheRespostas(idade_maxima_dias=idade_maxima_dias, tamanho_maximo_mb=tamanho_maximo_mb)
+
+
+@st.cache_resource
+def obter_diario():
+    return DiarioTrabalhos()
+
+
+@st.cache_resource
+def obter_limitador(rpm, tpm):
+    # Um balde por processo: lotes simultâneos (de qualquer sessão) dividem os limites da conta
+    return LimitadorTaxa(rpm=rpm, tpm=tpm)
+
 
 # ==============================================================================
-# FUNÇÕES AUXILIARES (UNIFICADOR DE DADOS)
+# ACOMPANHAMENTO DO LOTE EM SEGUNDO PLANO
 # ==============================================================================
-def processar_cpfs(df):
-    df = df.dropna(how='all', axis=1)
-    df.columns = [str(c).strip() for c in df.columns] 
-    
-    if 'CPF' not in df.columns:
-        st.error("Erro: Coluna 'CPF' não encontrada na origem.")
-        return None
-    
-    nome_coluna_corte = "Pergunta" 
-    if nome_coluna_corte not in df.columns:
-        st.error(f"Erro: Coluna '{nome_coluna_corte}' não encontrada.")
-        return None
-
-    try:
-        idx_corte = df.columns.get_loc(nome_coluna_corte)
-    except KeyError:
-        st.error("Erro ao localizar índice da coluna de corte.")
-        return None
-
-    dados_processados = []
-    grouped = df.groupby('CPF', sort=False)
-
-    for cpf, group in grouped:
-        if pd.isna(cpf) or str(cpf).strip() == "":
-            continue
-
-        linha_base = group.iloc[0].to_dict()
-        
-        if len(group) > 1:
-            segunda_linha = group.iloc[1]
-            colunas_extras = df.columns[idx_corte:]
-            
-            for col in colunas_extras:
-                novo_nome = f"{col}_2"
-                linha_base[novo_nome] = segunda_linha[col]
-        
-        dados_processados.append(linha_base)
-
-    return pd.DataFrame(dados_processados)
+def descrever_trabalho(diario, trabalho):
+    # Rótulo estável e único (sem contagens): o selectbox identifica a opção pelo texto exibido
+    criado_em = time.strftime("%d/%m %H:%M", time.localtime(trabalho['criado_em']))
+    return f"{criado_em} · {trabalho['modelo']} · {diario.contagens(trabalho['id'])['total']} registros · #{trabalho['id'][:6]}"
+
+
+def painel_trabalho(diario, trabalho_id):
+    # Executado como fragmento: só este trecho é reexecutado enquanto o lote roda
+    contagens = diario.contagens(trabalho_id)
+    ativo = em_execucao(trabalho_id)
+    finalizados = contagens['concluido'] + contagens['falhou']
+    st.progress(finalizados / contagens['total'] if contagens['total'] else 0.0)
+    st.caption(f"Lote {situacao_atual(diario.trabalho(trabalho_id))} · {contagens['concluido']} concluídos · {contagens['falhou']} com erro · "
+               f"{contagens['em_andamento']} em andamento · {contagens['pendente']} pendentes")
+
+    if ativo:
+        ca, cc = st.columns([1, 1])
+        ca.download_button("⬇️ Baixar Respostas Parciais (.zip)", lambda: diario.exportar_zip(trabalho_id),
+                           "respostas_docx_parcial.zip", "application/zip", on_click="ignore", key="btn_zip_parcial")
+        if cancelamento_solicitado(trabalho_id):
+            cc.button("⏳ Cancelando...", disabled=True, key="btn_cancelando_lote")
+        else:
+            cc.button("⏹️ Cancelar lote", key="btn_cancelar_lote", on_click=cancelar_trabalho, args=(trabalho_id,),
+                      help="Interrompe as gerações em andamento; os relatórios concluídos são mantidos.")
+
+        # Streaming: texto parcial dos relatórios que estão sendo gerados agora
+        parciais = {p['id']: p for p in respostas_parciais(trabalho_id)}
+        if parciais:
+            acompanhado = st.selectbox("✍️ Em geração agora", list(parciais),
+                                       format_func=lambda i: f"{parciais[i]['nome']} (#{i})")
+            with st.container(height=300):
+                st.markdown(parciais[acompanhado]['texto'])
+    elif st.session_state.get('acompanhando_trabalho'):
+        # O lote terminou: atualiza a página inteira para exibir as respostas
+        st.session_state.acompanhando_trabalho = False
+        st.rerun()
+
+
+def controles_pagina(total, chave, por_pagina=ITENS_POR_PAGINA):
+    # Devolve o deslocamento da página escolhida
+    paginas = max(1, math.ceil(total / por_pagina))
+    chave_pagina = f"pagina_{chave}"
+    # Uma busca pode reduzir o total abaixo da página guardada
+    if st.session_state.get(chave_pagina, 1) > paginas:
+        st.session_state[chave_pagina] = paginas
+    if paginas == 1:
+        return 0
+    pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, key=chave_pagina)
+    return (pagina - 1) * por_pagina
+
+
+def formatar_duracao(segundos):
+    segundos = int(round(segundos))
+    if segundos >= 3600:
+        return f"{segundos // 3600}h {segundos % 3600 // 60:02d}min"
+    if segundos >= 60:
+        return f"{segundos // 60}min {segundos % 60:02d}s"
+    return f"{segundos}s"
+
+
+def painel_metricas(telemetria):
+    resumo = telemetria.resumo()
+    requisicoes = resumo["requisicoes"]
+    contadores = resumo["contadores"]
+
+    def segundos(valor):
+        return f"{valor:.2f} s" if valor is not None else "-"
+
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("Requisições", requisicoes["total"])
+    m2.metric("Latência p50", segundos(requisicoes["latencia_p50"]))
+    m3.metric("Latência p95", segundos(requisicoes["latencia_p95"]))
+    m4.metric("429 / Retentativas", f"{contadores.get('respostas_429', 0)} / {contadores.get('retentativas', 0)}")
+    m5.metric("Tokens (prompt / resposta)", f"{contadores.get('tokens_prompt', 0)} / {contadores.get('tokens_resposta', 0)}")
+    st.caption(f"Respostas do cache: {contadores.get('cache_acertos', 0)} · Falhas: {contadores.get('falhas', 0)}")
+
+    if resumo["etapas"]:
+        st.markdown("**Duração por etapa**")
+        etapas = pd.DataFrame.from_dict(resumo["etapas"], orient="index")[["execucoes", "segundos_total", "segundos_medio", "ultima"]]
+        st.dataframe(etapas.rename(columns={"execucoes": "Execuções", "segundos_total": "Total (s)",
+                                            "segundos_medio": "Média (s)", "ultima": "Última (s)"}))
+    if requisicoes["total"]:
+        st.markdown("**Latência das requisições (s)**")
+        st.bar_chart(pd.Series(requisicoes["histograma"], name="Requisições"), sort=False)
+
+    d1, d2, d3 = st.columns(3)
+    d1.download_button("⬇️ Métricas (JSON)", telemetria.exportar_json, "metricas_dupar.json", "application/json",
+                       on_click="ignore", key="btn_metricas_json")
+    d2.download_button("⬇️ Métricas (Prometheus)", telemetria.exportar_prometheus, "metricas_dupar.prom", "text/plain",
+                       on_click="ignore", key="btn_metricas_prom")
+    if d3.button("🗑️ Zerar métricas", key="btn_zerar_metricas"):
+        telemetria.zerar()
+        st.rerun()
 
 
 # ==============================================================================
 # INTERFACE PRINCIPAL
 # ==============================================================================
+# Interface dentro de main(): os processos "spawn" do pool de DOCX reimportam este
+# arquivo como __mp_main__ e não devem montar a página
+def main():
+    # --- CONFIGURAÇÃO DA PÁGINA ---
+    st.set_page_config(page_title="Sistema Integrado DUPAR", page_icon="📊", layout="wide")
+
+    st.title("🚀 Sistema Integrado de Relatórios")
+
+    if 'telemetria' not in st.session_state:
+        st.session_state.telemetria = Telemetria()
+    telemetria = st.session_state.telemetria
+
+    tab1, tab2 = st.tabs(["📂 1. Unificador de Dados (ETL)", "🤖 2. Gerador com GPT"])
+
+    # ------------------------------------------------------------------------------
+    # ABA 1: UNIFICADOR DE DADOS
+    # ------------------------------------------------------------------------------
+    with tab1:
+        st.header("Limpeza e Unificação para Google Sheets")
+        st.markdown(f"""
+        **Status da Configuração:**
+        - **Origem (Fixa):** [Planilha de Dados Brutos]({URL_DADOS_BRUTOS})
+        - **Destino (Fixa):** [Planilha Mestra]({URL_G_SHEET_LINK})
+        """)
+
+        estado_ingestao = carregar_estado_ingestao()
+        if estado_ingestao.get("atualizado_em"):
+            st.caption(f"Última ingestão: {estado_ingestao['atualizado_em']} · "
+                       f"{estado_ingestao['linhas_lidas']} linhas lidas da origem · "
+                       f"último término: {estado_ingestao.get('ultimo_termino') or '-'}")
+        ressincronizar = st.checkbox("Ressincronização completa (reler toda a origem)", key="chk_resync",
+                                     help="Use quando linhas antigas da planilha de origem forem editadas.")
+
+        if st.button("🔄 Carregar Dados da Origem", type="secondary"):
+            st.session_state.dados_carregados = False 
+            try:
+                conn = st.connection("gsheets", type=GSheetsConnection)
 
-st.title("🚀 Sistema Integrado de Relatórios")
-
-tab1, tab2 = st.tabs(["📂 1. Unificador de Dados (ETL)", "🤖 2. Gerador com GPT"])
-
-# ------------------------------------------------------------------------------
-# ABA 1: UNIFICADOR DE DADOS
-# ------------------------------------------------------------------------------
-with tab1:
-    st.header("Limpeza e Unificação para Google Sheets")
-    st.markdown(f"""
-    **Status da Configuração:**
-    - **Origem (Fixa):** [Planilha de Dados Brutos]({URL_DADOS_BRUTOS})
-    - **Destino (Fixa):** [Planilha Mestra]({URL_G_SHEET_LINK})
-    """)
-    
-    if st.button("🔄 Carregar Dados da Origem", type="secondary"):
-        st.session_state.dados_carregados = False 
-        try:
-            conn = st.connection("gsheets", type=GSheetsConnection)
-
-            with st.spinner("Lendo dados brutos..."):
-                df_bruto = conn.read(spreadsheet=URL_DADOS_BRUTOS, header=6, ttl=0)
-                
-                if len(df_bruto) > 7:
-                    df_limpo = df_bruto.iloc[7:].reset_index(drop=True)
-                    st.toast("Linhas de teste removidas.", icon="ℹ️")
-                else:
-                    df_limpo = df_bruto
+                with st.spinner("Lendo dados brutos..."), telemetria.etapa("ingestao_origem"):
+                    df_limpo, qtd_novas = ingerir_origem(
+                        lambda inicio: ler_origem_a_partir_de(conn, URL_DADOS_BRUTOS, inicio),
+                        ressincronizar=ressincronizar,
+                    )
+                    st.toast(f"{qtd_novas} linhas novas carregadas ({len(df_limpo)} no total).", icon="ℹ️")
 
-                st.session_state.df_limpo_cache = df_limpo
-                st.session_state.dados_carregados = True
-                
-        except Exception as e:
-            st.error(f"Erro na leitura da origem: {e}")
+                    st.session_state.df_limpo_cache = df_limpo
+                    st.session_state.dados_carregados = True
 
-    if st.session_state.get('dados_carregados') and 'df_limpo_cache' in st.session_state:
-        df_display = st.session_state.df_limpo_cache
-        
-        with st.expander("Ver Prévia dos Dados Brutos Carregados", expanded=True):
-            st.dataframe(df_display, use_container_width=True, height=200)
+            except Exception as e:
+                st.error(f"Erro na leitura da origem: {e}")
 
-        st.divider()
+        if st.session_state.get('dados_carregados') and 'df_limpo_cache' in st.session_state:
+            df_display = st.session_state.df_limpo_cache
 
-        if st.button("⚙️ Processar e Atualizar Planilha Mestra", type="primary"):
-            if df_display.empty:
-                st.error("Não há dados para processar.")
-            else:
-                df_filtrado_unif = processar_cpfs(df_display)
-                
-                if df_filtrado_unif is not None and not df_filtrado_unif.empty:
-                    st.info(f"Processado! {len(df_filtrado_unif)} registros únicos encontrados. Gravando...")
-                    
-                    try:
-                        conn = st.connection("gsheets", type=GSheetsConnection)
-                        conn.update(spreadsheet=URL_G_SHEET_LINK, data=df_filtrado_unif)
-                        
-                        st.success("✅ Sucesso! Dados atualizados na Planilha Mestra.")
-                        st.markdown(f"**[Clique aqui para conferir a Planilha Mestra]({URL_G_SHEET_LINK})**")
-                        st.dataframe(df_filtrado_unif, use_container_width=True)
-                        
-                    except Exception as e_write:
-                        st.error(f"Erro ao escrever na planilha: {e_write}")
+            with st.expander("Ver Prévia dos Dados Brutos Carregados", expanded=True):
+                st.dataframe(df_display, use_container_width=True, height=200)
+
+            st.divider()
+
+            if st.button("⚙️ Processar e Atualizar Planilha Mestra", type="primary"):
+                if df_display.empty:
+                    st.error("Não há dados para processar.")
                 else:
-                    st.warning("Erro no processamento dos dados.")
-
-# ------------------------------------------------------------------------------
-# ABA 2: GERADOR GPT
-# ------------------------------------------------------------------------------
-with tab2:
-    st.header("Automação de Relatórios com IA")
-    
-    if 'processamento_concluido' not in st.session_state:
-        st.session_state.processamento_concluido = False
-    if 'zip_prompts' not in st.session_state:
-        st.session_state.zip_prompts = None
-    if 'todos_prompts' not in st.session_state:
-        st.session_state.todos_prompts = [] 
-    if 'respostas_geradas' not in st.session_state:
-        st.session_state.respostas_geradas = [] 
-    if 'zip_respostas' not in st.session_state:
-        st.session_state.zip_respostas = None
-
-    col_config, col_main = st.columns([1, 3])
-
-    with col_config:
-        st.subheader("Configurações IA")
-        api_key = st.text_input("OpenAI API Key", type="password", key="gpt_api_key")
-        modelo_gpt = st.selectbox("Modelo GPT", ["gpt-3.5-turbo", "gpt-4", "gpt-4o", "gpt-5.2"], key="gpt_model_select")
-        
-        st.divider()
-        st.subheader("Arquivos")
-        uploaded_excel = st.file_uploader("Upload Excel (Opcional)", type=["xlsx"], key="gpt_excel_upload")
-        uploaded_template = st.file_uploader("Upload Template (Opcional)", type=["txt"], key="gpt_template_upload")
-
-    with col_main:
-        df_gpt = None
-        template_content = ""
-
-        try:
-            if uploaded_excel:
-                df_gpt = pd.read_excel(uploaded_excel, sheet_name="dupar")
-            else:
-                try:
-                    df_gpt = pd.read_excel(URL_EXPORT_EXCEL, sheet_name="dupar")
-                    st.success(f"✅ Usando dados da Planilha Mestra")
-                except Exception as e:
-                    st.warning(f"Não foi possível ler a Planilha Mestra automaticamente. Use a Aba 1 primeiro. ({e})")
-
-            if uploaded_template:
-                template_content = uploaded_template.read().decode("utf-8")
-                st.info("Usando template carregado pelo usuário.")
-            else:
-                template_content = TEMPLATE_PADRAO
-                st.info("Usando template padrão embutido.")
-
-        except Exception as e:
-            st.error(f"Erro ao carregar arquivos: {e}")
-
-        if df_gpt is not None and template_content:
-            c1, c2 = st.columns([1, 1])
-            
-            with c1:
-                st.markdown("##### Seleção de Colunas")
-                todas_colunas = df_gpt.columns.tolist()
-                
-                colunas_selecionadas = st.multiselect(
-                    "Colunas para o prompt:",
-                    options=todas_colunas,
-                    default=todas_colunas,
-                    key="cols_multiselect"
+                    try:
+                        with telemetria.etapa("processar_cpfs"):
+                            df_filtrado_unif = processar_cpfs(df_display)
+                    except ValueError as e_proc:
+                        st.error(f"Erro: {e_proc}")
+                        df_filtrado_unif = None
+
+                    if df_filtrado_unif is not None and not df_filtrado_unif.empty:
+                        st.info(f"Processado! {len(df_filtrado_unif)} registros únicos encontrados. Gravando...")
+
+                        try:
+                            conn = st.connection("gsheets", type=GSheetsConnection)
+                            with telemetria.etapa("gravar_planilha_mestra"):
+                                gravacao = gravar_planilha_mestra(conn, URL_G_SHEET_LINK, df_filtrado_unif)
+                            invalidar_planilha_mestra()
+
+                            if gravacao['reescrita']:
+                                detalhe = f"planilha regravada com {len(df_filtrado_unif)} linhas"
+                            else:
+                                detalhe = (f"{gravacao['inseridas']} inseridas · {gravacao['atualizadas']} atualizadas · "
+                                           f"{gravacao['inalteradas']} inalteradas")
+                            st.success(f"✅ Sucesso! Dados atualizados na Planilha Mestra ({detalhe}; "
+                                       f"{gravacao['chamadas']} chamadas à API).")
+                            st.markdown(f"**[Clique aqui para conferir a Planilha Mestra]({URL_G_SHEET_LINK})**")
+                            st.dataframe(df_filtrado_unif, use_container_width=True)
+
+                        except Exception as e_write:
+                            st.error(f"Erro ao escrever na planilha: {e_write}")
+                    else:
+                        st.warning("Erro no processamento dos dados.")
+
+    # ------------------------------------------------------------------------------
+    # ABA 2: GERADOR GPT
+    # ------------------------------------------------------------------------------
+    with tab2:
+        st.header("Automação de Relatórios com IA")
+
+        if 'processamento_concluido' not in st.session_state:
+            st.session_state.processamento_concluido = False
+        if 'zip_prompts' not in st.session_state:
+            st.session_state.zip_prompts = None
+        # Só os metadados dos prompts ficam na sessão; os textos ficam em disco no armazém de prompts
+        if 'todos_prompts' not in st.session_state:
+            st.session_state.todos_prompts = [] 
+        if 'armazem_prompts' not in st.session_state:
+            st.session_state.armazem_prompts = None
+        if 'trabalho_id' not in st.session_state:
+            st.session_state.trabalho_id = None
+        if 'acompanhando_trabalho' not in st.session_state:
+            st.session_state.acompanhando_trabalho = False
+
+        diario = obter_diario()
+
+        col_config, col_main = st.columns([1, 3])
+
+        with col_config:
+            st.subheader("Configurações IA")
+            api_key = st.text_input("OpenAI API Key", type="password", key="gpt_api_key")
+            modelo_gpt = st.selectbox("Modelo GPT", ["gpt-3.5-turbo", "gpt-4", "gpt-4o", "gpt-5.2"], key="gpt_model_select")
+
+            with st.expander("Limites de Envio"):
+                max_concorrencia = st.number_input("Requisições simultâneas", min_value=1, max_value=64, value=8, key="gpt_concorrencia")
+                limite_rpm = st.number_input("Requisições por minuto (0 = sem limite)", min_value=0, value=500, step=50, key="gpt_rpm")
+                limite_tpm = st.number_input("Tokens por minuto (0 = sem limite)", min_value=0, value=200000, step=10000, key="gpt_tpm")
+                processos_docx = st.number_input("Processos para gerar DOCX (0 = sem pool)", min_value=0, max_value=32,
+                                                 value=min(4, os.cpu_count() or 1), key="gpt_processos_docx")
+                usar_stream = st.toggle("Streaming (relatório parcial ao vivo)", value=True, key="gpt_stream",
+                                        help="A resposta chega em trechos; o limite de tempo vale entre trechos, não para a geração inteira.")
+                timeout_ocioso = st.number_input("Tempo máximo sem receber trechos (s)", min_value=5, max_value=600,
+                                                 value=TIMEOUT_OCIOSO, key="gpt_timeout_ocioso", disabled=not usar_stream)
+
+            with st.expander("Preços (US$ por 1M tokens)"):
+                # Chaves por modelo: trocar de modelo traz os preços de referência dele
+                preco_padrao = PRECOS_POR_MILHAO.get(modelo_gpt, (0.0, 0.0, 0.0))
+                precos_modelo = (
+                    st.number_input("Entrada", min_value=0.0, value=preco_padrao[0], format="%.3f", key=f"gpt_preco_entrada_{modelo_gpt}"),
+                    st.number_input("Entrada em cache", min_value=0.0, value=preco_padrao[1], format="%.3f", key=f"gpt_preco_cache_{modelo_gpt}",
+                                    help="Preço dos tokens do prefixo (instruções fixas) reaproveitados pelo provedor."),
+                    st.number_input("Saída", min_value=0.0, value=preco_padrao[2], format="%.3f", key=f"gpt_preco_saida_{modelo_gpt}"),
                 )
-                st.caption(f"Registros: {len(df_gpt)}")
 
-                if st.button("📝 Preparar Prompts", type="primary", key="btn_prep_prompts"):
-                    if not colunas_selecionadas:
-                        st.error("Selecione colunas.")
-                    else:
-                        zip_buffer = io.BytesIO()
-                        prompts_gerados = [] 
-
-                        with zipfile.ZipFile(zip_buffer, "w") as zf:
-                            bar = st.progress(0)
-                            for i, row in df_gpt.iterrows():
-                                dados_filtrados = {col: row[col] for col in colunas_selecionadas}
-                                conteudo_prompt = ler_e_substituir_template(template_content, dados_filtrados)
-                                
-                                nome_pessoa = str(row.get('Nome', f'Registro {i+1}'))
-                                nome_limpo = re.sub(r'[^a-zA-Z0-9\s]', '', nome_pessoa).replace(' ', '_')
-                                
-                                zf.writestr(f"{nome_limpo}_prompt.txt", conteudo_prompt)
-                                prompts_gerados.append({
-                                    "id": i,
-                                    "nome": nome_pessoa,
-                                    "nome_arquivo": nome_limpo,
-                                    "conteudo": conteudo_prompt
-                                })
-                                bar.progress((i + 1) / len(df_gpt))
-                        
-                        zip_buffer.seek(0)
-                        st.session_state.processamento_concluido = True
-                        st.session_state.zip_prompts = zip_buffer
-                        st.session_state.todos_prompts = prompts_gerados
-                        st.session_state.respostas_geradas = [] 
-                        st.session_state.zip_respostas = None
-                        st.rerun()
-
-            with c2:
-                st.markdown("##### Visualização")
-                if colunas_selecionadas:
-                    st.dataframe(df_gpt[colunas_selecionadas], height=250, hide_index=True)
+            with st.expander("Cache de Respostas"):
+                usar_cache = st.toggle("Reaproveitar respostas em cache", value=True, key="gpt_usar_cache",
+                                       help="Desligado: todos os prompts são reenviados à API e o cache é atualizado.")
+                cache_gpt = obter_cache_respostas(
+                    st.number_input("Validade (dias)", min_value=1, value=30, key="gpt_cache_dias"),
+                    st.number_input("Tamanho máximo (MB)", min_value=1, value=200, key="gpt_cache_mb"),
+                )
+                stats_cache = cache_gpt.estatisticas()
+                st.caption(f"{stats_cache['registros']} respostas em cache ({stats_cache['tamanho_mb']:.1f} MB)")
+                if st.button("🗑️ Limpar cache", key="btn_limpar_cache"):
+                    cache_gpt.limpar()
+                    st.rerun()
+
+            st.divider()
+            st.subheader("Arquivos")
+            uploaded_excel = st.file_uploader("Upload Excel (Opcional)", type=["xlsx"], key="gpt_excel_upload")
+            uploaded_template = st.file_uploader("Upload Template (Opcional)", type=["txt"], key="gpt_template_upload")
+            uploaded_docx_base = st.file_uploader("Modelo DOCX base (Opcional)", type=["docx"], key="gpt_docx_base_upload",
+                                                  help="Documento com cabeçalho/rodapé e estilos da marca usado em todos os relatórios.")
+            caminho_docx_base = None
+            if uploaded_docx_base:
+                # Os processos do pool leem o modelo do disco; o nome pelo hash evita regravar a cada execução
+                dados_base = uploaded_docx_base.getvalue()
+                caminho_docx_base = os.path.join(tempfile.gettempdir(), f"dupar_base_{hashlib.sha1(dados_base).hexdigest()}.docx")
+                if not os.path.exists(caminho_docx_base):
+                    with open(caminho_docx_base, "wb") as f:
+                        f.write(dados_base)
+            recarregar_mestra = st.button("🔄 Recarregar Planilha Mestra", key="btn_recarregar_mestra",
+                                          help="Ignora a cópia local e baixa a Planilha Mestra novamente.")
+
+            st.divider()
+            st.subheader("Lotes")
+            trabalhos_recentes = {t['id']: t for t in diario.listar_trabalhos()}
+            if trabalhos_recentes:
+                # A seleção acompanha o lote aberto (inclusive um recém-criado pelo botão de processar)
+                if st.session_state.trabalho_id in trabalhos_recentes:
+                    st.session_state.sel_trabalho = st.session_state.trabalho_id
+
+                def abrir_trabalho():
+                    st.session_state.trabalho_id = st.session_state.sel_trabalho
+                    st.session_state.acompanhando_trabalho = bool(st.session_state.sel_trabalho) and em_execucao(st.session_state.sel_trabalho)
+
+                st.selectbox(
+                    "Lotes recentes", list(trabalhos_recentes), index=None,
+                    format_func=lambda i: descrever_trabalho(diario, trabalhos_recentes[i]),
+                    placeholder="Abrir um lote anterior...", key="sel_trabalho", on_change=abrir_trabalho,
+                    help="Os lotes continuam rodando com a aba fechada e podem ser retomados após uma queda do servidor.",
+                )
+
+                def excluir_trabalho_aberto():
+                    diario.excluir_trabalho(st.session_state.trabalho_id)
+                    st.session_state.trabalho_id = None
+                    st.session_state.sel_trabalho = None
+                    st.session_state.acompanhando_trabalho = False
+
+                lote_aberto = st.session_state.trabalho_id
+                if lote_aberto in trabalhos_recentes:
+                    st.button("🗑️ Excluir lote aberto", key="btn_excluir_lote", on_click=excluir_trabalho_aberto,
+                              disabled=em_execucao(lote_aberto),
+                              help="Apaga prompts, respostas e DOCX do lote. Cancele o lote antes, se estiver rodando.")
+                st.caption(f"Lotes sem atividade há mais de {RETENCAO_DIAS_PADRAO} dias são apagados automaticamente.")
+            else:
+                st.caption("Nenhum lote processado ainda.")
+
+        opcoes_lote = dict(
+            max_concorrencia=max_concorrencia,
+            limitador=obter_limitador(limite_rpm, limite_tpm),
+            cache=cache_gpt,
+            ler_cache=usar_cache,
+            processos=processos_docx,
+            caminho_docx_base=caminho_docx_base,
+            telemetria=telemetria,
+            stream=usar_stream,
+            timeout_ocioso=timeout_ocioso,
+        )
+
+        with col_main:
+            df_gpt = None
+            template_content = ""
+
+            try:
+                if uploaded_excel:
+                    df_gpt = pd.read_excel(uploaded_excel, sheet_name="dupar")
                 else:
-                    st.dataframe(df_gpt, height=250, hide_index=True)
-
-            if st.session_state.processamento_concluido:
-                st.divider()
-                cp, cg = st.columns([1, 1])
-                
-                with cp:
-                    st.markdown("##### 1. Prompts Prontos")
-                    st.download_button("⬇️ Baixar Prompts (.zip)", st.session_state.zip_prompts, "prompts.zip", "application/zip")
-                    
-                    with st.container(height=500):
-                        for item in st.session_state.todos_prompts:
-                            with st.expander(f"📄 {item['nome']}"):
-                                st.text_area("Conteúdo", item['conteudo'], height=150, key=f"t_{item['id']}")
-
-                with cg:
-                    st.markdown("##### 2. Respostas IA")
-                    
-                    # --- NOVO: MULTISELECT PARA FILTRAR ---
-                    opcoes_nomes = [p['nome'] for p in st.session_state.todos_prompts]
-                    
-                    selecionados_gpt = st.multiselect(
-                        "Selecione quem você deseja enviar:",
-                        options=opcoes_nomes,
-                        default=opcoes_nomes, # Padrão: Seleciona todos
-                        help="Remova nomes da lista se não quiser enviá-los."
+                    try:
+                        conn_mestra = st.connection("gsheets", type=GSheetsConnection)
+
+                        def baixar_mestra():
+                            with telemetria.etapa("baixar_planilha_mestra"):
+                                return pd.read_excel(URL_EXPORT_EXCEL, sheet_name="dupar")
+
+                        df_gpt, meta_mestra = carregar_planilha_mestra(
+                            baixar_mestra,
+                            obter_revisao=lambda: revisao_planilha(conn_mestra, URL_G_SHEET_LINK),
+                            forcar=recarregar_mestra,
+                        )
+                        baixado_em = time.strftime("%d/%m %H:%M", time.localtime(meta_mestra["baixado_em"]))
+                        st.success(f"✅ Usando dados da Planilha Mestra (cópia local de {baixado_em})")
+                    except Exception as e:
+                        st.warning(f"Não foi possível ler a Planilha Mestra automaticamente. Use a Aba 1 primeiro. ({e})")
+
+                if uploaded_template:
+                    template_content = uploaded_template.read().decode("utf-8")
+                    st.info("Usando template carregado pelo usuário.")
+                else:
+                    template_content = TEMPLATE_PADRAO
+                    st.info("Usando template padrão embutido.")
+
+            except Exception as e:
+                st.error(f"Erro ao carregar arquivos: {e}")
+
+            if df_gpt is not None and template_content:
+                c1, c2 = st.columns([1, 1])
+
+                with c1:
+                    st.markdown("##### Seleção de Colunas")
+                    todas_colunas = df_gpt.columns.tolist()
+
+                    colunas_selecionadas = st.multiselect(
+                        "Colunas para o prompt:",
+                        options=todas_colunas,
+                        default=todas_colunas,
+                        key="cols_multiselect"
                     )
-                    
-                    if st.button(f"🚀 Processar Selecionados ({len(selecionados_gpt)})", type="primary", key="btn_run_gpt"):
-                        if not api_key:
-                            st.warning("⚠️ Insira a API Key.")
-                        elif not selecionados_gpt:
-                            st.warning("⚠️ Selecione pelo menos um registro na caixa acima.")
+                    st.caption(f"Registros: {len(df_gpt)}")
+
+                    try:
+                        template_compilado = compilar_template(template_content)
+                    except ValueError as e_template:
+                        st.error(f"Template inválido: {e_template}")
+                        template_compilado = None
+                    campos_ausentes = template_compilado.faltantes(df_gpt.columns) if template_compilado else []
+                    aceitar_ausentes = True
+                    if campos_ausentes:
+                        st.warning("O template usa campos que não existem na planilha: "
+                                   + ", ".join(f"`{c}`" for c in campos_ausentes))
+                        aceitar_ausentes = st.checkbox("Gerar mesmo assim (campos ausentes ficam vazios)", key="chk_aceitar_ausentes")
+
+                    if st.button("📝 Preparar Prompts", type="primary", key="btn_prep_prompts"):
+                        if not colunas_selecionadas:
+                            st.error("Selecione colunas.")
+                        elif template_compilado is None:
+                            st.error("Corrija o template antes de gerar os prompts.")
+                        elif not aceitar_ausentes:
+                            st.error("Corrija o template ou confirme a geração com campos ausentes.")
                         else:
-                            st.session_state.respostas_geradas = [] 
-                            status_text = st.empty()
-                            bar_gpt = st.progress(0)
-                            
-                            # Filtra a lista completa com base na seleção
-                            fila_processamento = [p for p in st.session_state.todos_prompts if p['nome'] in selecionados_gpt]
-                            
-                            zip_resp_io = io.BytesIO()
-                            with zipfile.ZipFile(zip_resp_io, "w") as zf_resp:
-                                total = len(fila_processamento)
-                                for idx, item in enumerate(fila_processamento):
-                                    status_text.text(f"Processando {idx+1}/{total}: {item['nome']}...")
-                                    
-                                    resp_txt = chamar_gpt(api_key, item['conteudo'], modelo_gpt)
-                                    
-                                    st.session_state.respostas_geradas.append({"nome": item['nome'], "resposta": resp_txt})
-                                    
-                                    docx_bytes = criar_docx_bytes(resp_txt)
-                                    zf_resp.writestr(f"RESPOSTA_{item['nome_arquivo']}.docx", docx_bytes)
-                                    
-                                    bar_gpt.progress((idx + 1) / total)
-                            
-                            zip_resp_io.seek(0)
-                            st.session_state.zip_respostas = zip_resp_io
-                            status_text.success("Concluído!")
+                            zip_prompts = ZipIncremental()
+                            with telemetria.etapa("preparar_prompts"):
+                                prompts_gerados = preparar_prompts(df_gpt, template_content, colunas_selecionadas,
+                                                                   permitir_ausentes=aceitar_ausentes)
+                            with telemetria.etapa("gravar_prompts_zip"):
+                                gravar_prompts(prompts_gerados, zip_prompts)
+                            armazem_prompts = ArmazemPrompts()
+
+                            st.session_state.processamento_concluido = True
+                            st.session_state.zip_prompts = zip_prompts
+                            st.session_state.todos_prompts = armazem_prompts.gravar(prompts_gerados)
+                            st.session_state.armazem_prompts = armazem_prompts
+                            st.session_state.contagem_tokens = None
                             st.rerun()
 
-                    if st.session_state.zip_respostas:
-                        st.download_button("⬇️ Baixar Respostas (.zip)", st.session_state.zip_respostas, "respostas_docx.zip", "application/zip", type="primary")
-                    
-                    with st.container(height=500):
-                        if not st.session_state.respostas_geradas:
-                            st.info("Aguardando processamento...")
+                with c2:
+                    st.markdown("##### Visualização")
+                    if colunas_selecionadas:
+                        st.dataframe(df_gpt[colunas_selecionadas], height=250, hide_index=True)
+                    else:
+                        st.dataframe(df_gpt, height=250, hide_index=True)
+
+                if st.session_state.processamento_concluido or st.session_state.trabalho_id:
+                    st.divider()
+                    cp, cg = st.columns([1, 1])
+
+                    with cp:
+                        st.markdown("##### 1. Prompts Prontos")
+                        if st.session_state.zip_prompts is not None:
+                            st.download_button("⬇️ Baixar Prompts (.zip)", st.session_state.zip_prompts.ler_bytes, "prompts.zip", "application/zip")
+                        armazem_prompts = st.session_state.armazem_prompts
+                        if armazem_prompts is not None and armazem_prompts.instrucoes:
+                            with st.expander("🧭 Instruções fixas (mensagem de sistema, igual para todos)"):
+                                st.text_area("Instruções", armazem_prompts.instrucoes, height=150, key="t_instrucoes")
+
+                        busca_prompts = st.text_input("🔎 Buscar por nome", key="busca_prompts").strip().lower()
+                        prompts_filtrados = st.session_state.todos_prompts
+                        if busca_prompts:
+                            prompts_filtrados = [p for p in prompts_filtrados if busca_prompts in p['nome'].lower()]
+                        inicio_prompts = controles_pagina(len(prompts_filtrados), "prompts")
+                        st.caption(f"{len(prompts_filtrados)} prompt(s)")
+
+                        with st.container(height=500):
+                            for item in prompts_filtrados[inicio_prompts:inicio_prompts + ITENS_POR_PAGINA]:
+                                with st.expander(f"📄 {item['nome']}"):
+                                    st.text_area("Conteúdo", armazem_prompts.ler(item['id']), height=150, key=f"t_{item['id']}")
+
+                    with cg:
+                        st.markdown("##### 2. Respostas IA")
+
+                        # Seleção pelo id do registro (nomes podem se repetir); a tabela é virtualizada no navegador
+                        enviar_todos = st.toggle("Enviar todos os registros", value=True, key="tgl_enviar_todos")
+                        if enviar_todos:
+                            fila_processamento = st.session_state.todos_prompts
                         else:
-                            for r in st.session_state.respostas_geradas:
-                                icon = "❌" if "Erro" in r['resposta'] else "✅"
-                                with st.expander(f"{icon} {r['nome']}"):
-                                    st.markdown(r['resposta'])
-
-        elif df_gpt is None:
-            st.info("Aguardando dados (Verifique Aba 1)...")
\ No newline at end of file
+                            tabela_selecao = pd.DataFrame(
+                                {"Nome": [p['nome'] for p in st.session_state.todos_prompts]},
+                                index=pd.Index([p['id'] for p in st.session_state.todos_prompts], name="ID"),
+                            )
+                            evento_selecao = st.dataframe(tabela_selecao, height=250, on_select="rerun",
+                                                          selection_mode="multi-row", key="tbl_selecao_gpt")
+                            ids_selecionados = set(tabela_selecao.index[evento_selecao.selection.rows])
+                            fila_processamento = [p for p in st.session_state.todos_prompts if p['id'] in ids_selecionados]
+
+                        # Pré-verificação: tokens contados uma vez por modelo, custo e tempo do lote selecionado
+                        contagem = st.session_state.get('contagem_tokens')
+                        if contagem is None or contagem['modelo'] != modelo_gpt:
+                            contagem = {"modelo": modelo_gpt,
+                                        "por_id": contar_tokens_prompts(armazem_prompts.completos(st.session_state.todos_prompts)
+                                                                        if armazem_prompts is not None else [], modelo_gpt)}
+                            st.session_state.contagem_tokens = contagem
+                        resumo_telemetria = telemetria.resumo()
+                        respostas_medidas = resumo_telemetria["requisicoes"]["por_status"].get("200", 0)
+                        tokens_resposta_medio = (resumo_telemetria["contadores"].get("tokens_resposta", 0) // respostas_medidas
+                                                 if respostas_medidas else 0)
+                        estimativa = estimar_lote(
+                            fila_processamento, modelo_gpt, contagem['por_id'],
+                            max_concorrencia=max_concorrencia, rpm=limite_rpm, tpm=limite_tpm,
+                            latencia_media=resumo_telemetria["requisicoes"]["latencia_media"],
+                            tokens_resposta=tokens_resposta_medio or RESERVA_TOKENS_RESPOSTA, precos=precos_modelo,
+                            instrucoes=armazem_prompts.instrucoes if armazem_prompts is not None else "",
+                        )
+                        if fila_processamento:
+                            custo = f"US$ {estimativa['custo_usd']:.2f}" if estimativa['custo_usd'] is not None else "informe os preços"
+                            st.caption(
+                                f"Estimativa: {estimativa['tokens_entrada']:,} tokens de entrada"
+                                f" ({estimativa['tokens_cache']:,} do cache de prefixo) + {estimativa['tokens_saida']:,} de saída"
+                                f" · custo ≈ {custo} · tempo ≈ {formatar_duracao(estimativa['segundos'])}"
+                                + ("" if contagem_exata(modelo_gpt) else " · tokens estimados (~4 caracteres/token)")
+                            )
+                        acima_do_limite = set(estimativa['acima_do_limite'])
+                        if acima_do_limite:
+                            nomes_acima = [p['nome'] for p in fila_processamento if p['id'] in acima_do_limite]
+                            st.warning(f"⚠️ {len(nomes_acima)} prompt(s) excedem o limite de contexto do modelo "
+                                       f"({estimativa['limite_contexto']:,} tokens) e não serão enviados: " + ", ".join(nomes_acima[:10])
+                                       + (" ..." if len(nomes_acima) > 10 else ""))
+                            fila_processamento = [p for p in fila_processamento if p['id'] not in acima_do_limite]
+
+                        if st.button(f"🚀 Processar Selecionados ({len(fila_processamento)})", type="primary", key="btn_run_gpt"):
+                            if not api_key:
+                                st.warning("⚠️ Insira a API Key.")
+                            elif not fila_processamento:
+                                st.warning("⚠️ Selecione pelo menos um registro na tabela acima.")
+                            else:
+                                # O lote roda numa thread em segundo plano; o diário guarda o estado de cada registro
+                                trabalho_id = diario.criar_trabalho(list(armazem_prompts.completos(fila_processamento)), modelo_gpt)
+                                iniciar_trabalho(diario, trabalho_id, api_key, **opcoes_lote)
+                                st.session_state.trabalho_id = trabalho_id
+                                st.session_state.acompanhando_trabalho = True
+                                st.rerun()
+
+                        trabalho = diario.trabalho(st.session_state.trabalho_id) if st.session_state.trabalho_id else None
+                        if trabalho is not None:
+                            situacao = situacao_atual(trabalho)
+                            contagens = diario.contagens(trabalho['id'])
+                            st.fragment(painel_trabalho, run_every=INTERVALO_ACOMPANHAMENTO if situacao == EXECUTANDO else None)(
+                                diario, trabalho['id'])
+
+                            if situacao != EXECUTANDO:
+                                if trabalho['erro']:
+                                    st.error(f"Lote interrompido: {trabalho['erro']}")
+                                elif situacao == CANCELADO:
+                                    st.info(f"Lote cancelado: {contagens['concluido']} relatório(s) concluído(s) mantido(s). "
+                                            "Retome para processar os restantes.")
+                                cr, cf = st.columns([1, 1])
+                                with cr:
+                                    retomar = contagens['pendente'] + contagens['em_andamento'] > 0 and situacao != FINALIZADO
+                                    if retomar and st.button("▶️ Retomar lote", key="btn_retomar_lote"):
+                                        if not api_key:
+                                            st.warning("⚠️ Insira a API Key.")
+                                        else:
+                                            iniciar_trabalho(diario, trabalho['id'], api_key, **opcoes_lote)
+                                            st.session_state.acompanhando_trabalho = True
+                                            st.rerun()
+                                with cf:
+                                    if contagens['falhou'] and st.button(f"🔁 Reprocessar falhas ({contagens['falhou']})", key="btn_reprocessar_falhas"):
+                                        if not api_key:
+                                            st.warning("⚠️ Insira a API Key.")
+                                        else:
+                                            diario.reenfileirar_falhas(trabalho['id'])
+                                            iniciar_trabalho(diario, trabalho['id'], api_key, **opcoes_lote)
+                                            st.session_state.acompanhando_trabalho = True
+                                            st.rerun()
+                                if contagens['concluido']:
+                                    st.download_button("⬇️ Baixar Respostas (.zip)", lambda: diario.exportar_zip(trabalho['id']),
+                                                       "respostas_docx.zip", "application/zip", type="primary")
+
+                        cb, ce = st.columns([2, 1])
+                        busca_respostas = cb.text_input("🔎 Buscar por nome", key="busca_respostas").strip()
+                        somente_erros = ce.checkbox("Somente com erro", key="chk_somente_erros")
+                        estados_revisao = (FALHOU,) if somente_erros else (CONCLUIDO, FALHOU)
+                        total_respostas = (diario.contar_registros(trabalho['id'], estados_revisao, busca_respostas)
+                                           if trabalho is not None else 0)
+                        inicio_respostas = controles_pagina(total_respostas, "respostas")
+
+                        with st.container(height=500):
+                            respostas_geradas = diario.registros(trabalho['id'], estados_revisao, busca_respostas,
+                                                                 ITENS_POR_PAGINA, inicio_respostas) if trabalho is not None else []
+                            if trabalho is None:
+                                st.info("Aguardando processamento...")
+                            elif not respostas_geradas:
+                                st.info("Nenhuma resposta encontrada.")
+                            else:
+                                for r in respostas_geradas:
+                                    icon = "❌" if r['erro'] else "✅"
+                                    with st.expander(f"{icon} {r['nome']}"):
+                                        st.markdown(diario.ler_resposta(trabalho['id'], r['id']))
+
+            elif df_gpt is None:
+                st.info("Aguardando dados (Verifique Aba 1)...")
+
+    st.divider()
+    with st.expander("📈 Métricas de Desempenho"):
+        # Atualiza junto com o painel do lote enquanto houver um lote em segundo plano
+        st.fragment(painel_metricas, run_every=INTERVALO_ACOMPANHAMENTO if st.session_state.get('acompanhando_trabalho') else None)(
+            telemetria)
+
+
+if __name__ == "__main__":
+    main()
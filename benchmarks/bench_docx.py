@@ -0,0 +1,62 @@
+import argparse
+import io
+import re
+import time
+
+from docx import Document
+
+from benchmarks.respostas_sinteticas import gerar_respostas
+from docx_relatorio import RenderizadorDocx
+
+
+def _negrito_legado(paragrafo, texto):
+    for parte in re.split(r'(\*\*.*?\*\*)', texto):
+        if parte.startswith('**') and parte.endswith('**'):
+            paragrafo.add_run(parte[2:-2]).bold = True
+        else:
+            paragrafo.add_run(parte)
+
+
+def criar_docx_bytes_legado(texto_resposta):
+    # Implementação anterior (Document() por relatório, sem tabelas), mantida como referência
+    doc = Document()
+    for linha in texto_resposta.split('\n'):
+        linha = linha.strip()
+        if not linha: continue
+        if linha.startswith('#'):
+            doc.add_heading(linha.lstrip('#').strip(), level=min(linha.count('#'), 9))
+        elif linha.startswith('- ') or linha.startswith('* '):
+            _negrito_legado(doc.add_paragraph(style='List Bullet'), linha[2:])
+        else:
+            _negrito_legado(doc.add_paragraph(), linha)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def relatorios_por_segundo(funcao, respostas):
+    inicio = time.perf_counter()
+    for texto in respostas:
+        funcao(texto)
+    return len(respostas) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara o renderizador DOCX com a implementação anterior.")
+    parser.add_argument("--quantidade", type=int, default=1000)
+    parser.add_argument("--base", help="Documento .docx base (padrão: modelo do python-docx)")
+    args = parser.parse_args()
+
+    respostas = gerar_respostas(args.quantidade)
+    renderizador = RenderizadorDocx(args.base)
+
+    legado = relatorios_por_segundo(criar_docx_bytes_legado, respostas)
+    novo = relatorios_por_segundo(renderizador.renderizar, respostas)
+    print(f"{args.quantidade} respostas")
+    print(f"  anterior:    {legado:8.1f} relatórios/s (tabelas como texto)")
+    print(f"  renderizador:{novo:8.1f} relatórios/s (tabelas Word)")
+    print(f"  ganho:       {novo / legado:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
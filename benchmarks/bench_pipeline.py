@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import cliente_gpt
+from benchmarks.dados_sinteticos import gerar_planilha_bruta
+from benchmarks.respostas_sinteticas import gerar_respostas
+from benchmarks.servidor_mock import ServidorMock
+from telemetria import Telemetria
+from docx_relatorio import criar_docx_bytes
+from motor import preparar_prompts
+from saida_lote import ZipIncremental
+from template_prompt import TEMPLATE_PADRAO, ler_e_substituir_template
+from unificador import LINHA_CABECALHO, LINHAS_TESTE, processar_cpfs
+
+
+def medir(funcao, itens):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - inicio
+    return resultado, {
+        "segundos": round(segundos, 4),
+        "itens": itens,
+        "itens_por_segundo": round(itens / segundos, 1) if segundos else None,
+    }
+
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ==============================================================================
+# ETAPAS LOCAIS (ETL -> PROMPTS -> DOCX -> ZIP)
+# ==============================================================================
+def medir_etapas_locais(n_linhas, max_docx, diretorio):
+    etapas = {}
+    caminho = os.path.join(diretorio, f"origem_{n_linhas}.csv")
+    gerar_planilha_bruta(n_linhas).to_csv(caminho, index=False, header=False)
+
+    bruto, etapas["leitura_origem"] = medir(
+        lambda: pd.read_csv(caminho, header=LINHA_CABECALHO).iloc[LINHAS_TESTE:].reset_index(drop=True), n_linhas)
+    df, etapas["processar_cpfs"] = medir(lambda: processar_cpfs(bruto), n_linhas)
+
+    registros = df.to_dict("records")
+    _, etapas["template_por_linha"] = medir(
+        lambda: [ler_e_substituir_template(TEMPLATE_PADRAO, dados) for dados in registros], len(df))
+    _, etapas["preparar_prompts"] = medir(lambda: preparar_prompts(df, TEMPLATE_PADRAO), len(df))
+
+    respostas = gerar_respostas(min(len(df), max_docx))
+    documentos, etapas["criar_docx_bytes"] = medir(lambda: [criar_docx_bytes(r) for r in respostas], len(respostas))
+
+    def montar_zip():
+        zip_saida = ZipIncremental()
+        for i, docx in enumerate(documentos):
+            zip_saida.adicionar(f"RESPOSTA_{i}.docx", docx)
+        zip_saida.fechar()
+        return zip_saida.ler_bytes()
+
+    dados_zip, etapas["montagem_zip"] = medir(montar_zip, len(documentos))
+    etapas["montagem_zip"]["megabytes"] = round(len(dados_zip) / (1024 * 1024), 2)
+    return {"linhas": n_linhas, "registros_unificados": len(df), "etapas": etapas}, df
+
+
+# ==============================================================================
+# ETAPA GPT CONTRA O SERVIDOR LOCAL
+# ==============================================================================
+def medir_etapa_gpt(prompts, args):
+    url_original = cliente_gpt.URL_CHAT_COMPLETIONS
+    with ServidorMock(latencia=args.latencia, variacao=args.variacao, taxa_429=args.taxa_429,
+                      retry_after=args.retry_after) as servidor:
+        cliente_gpt.URL_CHAT_COMPLETIONS = f"{servidor.url_base}/chat/completions"
+        telemetria = Telemetria()
+        try:
+            limitador = cliente_gpt.LimitadorTaxa(rpm=args.rpm, tpm=args.tpm) if args.rpm or args.tpm else None
+            resultado, medicao = medir(
+                lambda: cliente_gpt.processar_em_lote("sk-benchmark", prompts, max_concorrencia=args.concorrencia,
+                                                      limitador=limitador, telemetria=telemetria,
+                                                      stream=args.stream), len(prompts))
+        finally:
+            cliente_gpt.URL_CHAT_COMPLETIONS = url_original
+        medicao.update({
+            "concorrencia": args.concorrencia,
+            "stream": args.stream,
+            "latencia_servidor": args.latencia,
+            "taxa_429": args.taxa_429,
+            "requisicoes_servidor": servidor.requisicoes,
+            "respostas_429": servidor.respostas_429,
+            "respostas_com_erro": sum(cliente_gpt.eh_erro(r) for _, r in resultado),
+        })
+        primeiro_trecho = telemetria.resumo()["etapas"].get("gpt_primeiro_trecho")
+        if primeiro_trecho:
+            medicao["primeiro_trecho_medio"] = round(primeiro_trecho["segundos_medio"], 4)
+    return medicao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta do pipeline DUPAR com dados sintéticos.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Tamanhos da planilha bruta sintética")
+    parser.add_argument("--max-docx", type=int, default=500, help="Limite de relatórios DOCX/ZIP por tamanho")
+    parser.add_argument("--gpt-registros", type=int, default=200, help="Prompts enviados ao servidor local (0 = pula a etapa)")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=0, help="Limite de requisições por minuto (0 = sem limitador)")
+    parser.add_argument("--tpm", type=int, default=0, help="Limite de tokens por minuto (0 = sem limitador)")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latência média do servidor local (s)")
+    parser.add_argument("--variacao", type=float, default=0.02, help="Variação da latência (± s)")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração das requisições respondidas com 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After devolvido nos 429 (s)")
+    parser.add_argument("--stream", action="store_true", help="Recebe as respostas em streaming (SSE)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultado (padrão: stdout)")
+    args = parser.parse_args()
+
+    resultado = {
+        "executado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit_atual(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "parametros": vars(args),
+        "tamanhos": [],
+    }
+    prompts_gpt = None
+    with tempfile.TemporaryDirectory(prefix="dupar_bench_") as diretorio:
+        for n in args.linhas:
+            print(f"Medindo {n} linhas...", file=sys.stderr)
+            medicao, df = medir_etapas_locais(n, args.max_docx, diretorio)
+            resultado["tamanhos"].append(medicao)
+            if prompts_gpt is None and args.gpt_registros:
+                prompts_gpt = preparar_prompts(df.head(args.gpt_registros), TEMPLATE_PADRAO)
+
+    if prompts_gpt:
+        print(f"Medindo etapa GPT ({len(prompts_gpt)} prompts)...", file=sys.stderr)
+        resultado["gpt"] = medir_etapa_gpt(prompts_gpt, args)
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.dados_sinteticos import gerar_linhas_brutas
+from unificador import NOME_COLUNA_CORTE, normalizar_cpf, processar_cpfs
+
+
+def processar_cpfs_laco(df):
+    # Implementação anterior (laço por grupo, apenas 2 submissões), mantida como referência
+    df = df.dropna(how='all', axis=1)
+    df.columns = [str(c).strip() for c in df.columns]
+    idx_corte = df.columns.get_loc(NOME_COLUNA_CORTE)
+    dados_processados = []
+    for cpf, group in df.groupby('CPF', sort=False):
+        if pd.isna(cpf) or str(cpf).strip() == "":
+            continue
+        linha_base = group.iloc[0].to_dict()
+        if len(group) > 1:
+            segunda_linha = group.iloc[1]
+            for col in df.columns[idx_corte:]:
+                linha_base[f"{col}_2"] = segunda_linha[col]
+        dados_processados.append(linha_base)
+    return pd.DataFrame(dados_processados)
+
+
+def cronometrar(funcao, df, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(df)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara processar_cpfs vetorizado com o laço anterior.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'linhas':>8} {'laço (s)':>10} {'vetorizado (s)':>15} {'ganho':>7}")
+    for n in args.linhas:
+        df = gerar_linhas_brutas(n)
+        # O laço não normaliza CPF; normaliza antes para comparar o mesmo agrupamento
+        df_laco = df.assign(CPF=normalizar_cpf(df['CPF']))
+        t_laco = cronometrar(processar_cpfs_laco, df_laco, args.repeticoes)
+        t_vetor = cronometrar(processar_cpfs, df, args.repeticoes)
+        print(f"{n:>8} {t_laco:>10.3f} {t_vetor:>15.3f} {t_laco / t_vetor:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import random
+
+import pandas as pd
+
+from unificador import LINHA_CABECALHO, LINHAS_TESTE
+
+COLUNAS_IDENTIFICACAO = [
+    "Horario de inicio", "Horario de termino", "Tempo de resposta", "Data de Aplicação",
+    "Nome", "E-mail", "Naturalidade", "CPF", "Data de nascimento", "Objetivo",
+    "Tipo de Aplicação", "Nome do Aplicador", "Escolha da Atividade",
+]
+COLUNAS_FRACTAL = [
+    "Pergunta",
+    "RESPOSTA 1", "HIERAQUIA 1", "JUSTIFICATIVA 1",
+    "RESPOSTA 2", "HIERAQUIA 2", "JUSTIFICATIVA 2",
+    "RESPOSTA 3", "HIERAQUIA 3", "JUSTIFICATIVA 3",
+    "FEEDBACK FINAL",
+]
+COLUNAS_ORIGEM = COLUNAS_IDENTIFICACAO + COLUNAS_FRACTAL
+
+_NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Iara", "João"]
+_SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Lima", "Pereira", "Costa", "Almeida"]
+_CIDADES = ["São Paulo", "Recife", "Curitiba", "Belém", "Salvador", "Goiânia"]
+
+
+def _formatar_cpf(numero, formato):
+    digitos = f"{numero:011d}"
+    if formato == 0:
+        return f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+    if formato == 1:
+        return digitos
+    return float(numero)  # como o Sheets devolve quando a coluna é numérica
+
+
+def gerar_linhas_brutas(n_linhas, max_submissoes=3, semente=42):
+    # Linhas já sem cabeçalho/teste, como em df_limpo_cache (1 a max_submissoes por CPF)
+    rng = random.Random(semente)
+    linhas = []
+    pessoa = 0
+    while len(linhas) < n_linhas:
+        pessoa += 1
+        numero = 10_000_000_000 + pessoa * 7919
+        nome = f"{rng.choice(_NOMES)} {rng.choice(_SOBRENOMES)} {pessoa}"
+        for submissao in range(rng.randint(1, max_submissoes)):
+            if len(linhas) >= n_linhas:
+                break
+            linha = {
+                "Horario de inicio": f"2026-03-{1 + pessoa % 28:02d} 09:{submissao:02d}:00",
+                "Horario de termino": f"2026-03-{1 + pessoa % 28:02d} 09:{submissao + 20:02d}:00",
+                "Tempo de resposta": f"{rng.randint(5, 40)} min",
+                "Data de Aplicação": f"{1 + pessoa % 28:02d}/03/2026",
+                "Nome": nome,
+                "E-mail": f"pessoa{pessoa}@exemplo.com",
+                "Naturalidade": rng.choice(_CIDADES),
+                "CPF": _formatar_cpf(numero, rng.randint(0, 2)),
+                "Data de nascimento": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1960, 2005)}",
+                "Objetivo": "Autoconhecimento",
+                "Tipo de Aplicação": rng.choice(["Assistida", "Autoaplicada"]),
+                "Nome do Aplicador": rng.choice(_NOMES),
+                "Escolha da Atividade": rng.choice(["Instrutor", "Própria pessoa"]),
+                "Pergunta": f"Pergunta do fractal {submissao + 1}",
+                "FEEDBACK FINAL": "Gostei da atividade. " * rng.randint(1, 5),
+            }
+            for i in (1, 2, 3):
+                linha[f"RESPOSTA {i}"] = f"Resposta {i} de {nome}: " + "texto livre " * rng.randint(3, 20)
+                linha[f"HIERAQUIA {i}"] = rng.randint(1, 3)
+                linha[f"JUSTIFICATIVA {i}"] = "porque " * rng.randint(2, 10)
+            linhas.append(linha)
+    return pd.DataFrame(linhas, columns=COLUNAS_ORIGEM)
+
+
+def gerar_planilha_bruta(n_linhas, max_submissoes=3, semente=42):
+    # Layout da exportação da origem: metadados do formulário, cabeçalho na linha LINHA_CABECALHO,
+    # LINHAS_TESTE linhas de teste e só então as respostas (ler com header=LINHA_CABECALHO)
+    dados = gerar_linhas_brutas(n_linhas, max_submissoes, semente)
+    metadados = [["Formulário DUPAR"] + [None] * (len(COLUNAS_ORIGEM) - 1)] * LINHA_CABECALHO
+    teste = dados.head(LINHAS_TESTE).assign(Nome="TESTE", CPF="000.000.000-00").values.tolist()
+    linhas = metadados + [COLUNAS_ORIGEM] + teste + dados.values.tolist()
+    return pd.DataFrame(linhas)
@@ -0,0 +1,39 @@
+import random
+
+_PADROES = ["socialização", "reflexão", "lazer", "propósito", "sentimento"]
+
+
+def gerar_resposta(indice, rng):
+    # Resposta no formato que o TEMPLATE_PADRAO pede: identificação, quadro, interpretação, sugestões
+    nome = f"Pessoa {indice}"
+    linhas = [
+        f"# Relatório de {nome}",
+        "## Identificação",
+        f"- **Nome:** {nome}",
+        f"- **CPF:** {10_000_000_000 + indice}",
+        f"- **E-mail:** pessoa{indice}@exemplo.com",
+        "- **Objetivo:** Autoconhecimento",
+        "## Registro de Dados",
+        "| Nº | Resposta | Hierarquia | Padrão identificado |",
+        "|----|----------|------------|---------------------|",
+    ]
+    for n in range(1, 7):
+        linhas.append(f"| {n} | Texto da resposta {n} " + "palavra " * rng.randint(3, 12)
+                      + f"| {rng.randint(1, 3)} | **{rng.choice(_PADROES)}** |")
+    linhas += [
+        "",
+        "## Interpretação",
+        "O quadro mostra que " + "a pessoa demonstra *atenção* ao contexto e " * rng.randint(4, 10) + "busca equilíbrio.",
+        "## Sugestões",
+        "1. Desenvolver a escuta ativa.",
+        "2. Praticar atividades de lazer regularmente.",
+        "3. Registrar reflexões semanais.",
+        "## Categorização",
+    ]
+    linhas += [f"- {p}: {rng.randint(0, 100)}%" for p in _PADROES]
+    return "\n".join(linhas)
+
+
+def gerar_respostas(quantidade, semente=7):
+    rng = random.Random(semente)
+    return [gerar_resposta(i, rng) for i in range(quantidade)]
@@ -0,0 +1,183 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.respostas_sinteticas import gerar_resposta
+
+
+class _ServidorHTTP(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cliente que fecha uma conexão keep-alive ociosa (ou desiste de um stream) não é erro do servidor
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+# ==============================================================================
+# SERVIDOR LOCAL NO FORMATO DE /v1/chat/completions
+# ==============================================================================
+class ServidorMock:
+    # Responde como a API da OpenAI, com latência (média ± variação) e uma fração de respostas 429
+    # com Retry-After. Com "stream": true a latência é distribuída entre `trechos` eventos SSE.
+    # `falhas_stream` ("truncar" ou "erro") é consumida pelos streams seguintes, na ordem: no meio
+    # da resposta a conexão é encerrada sem "[DONE]" ou chega um evento de erro, como na API.
+    # Use `url_base` em OPENAI_BASE_URL ou em cliente_gpt.URL_CHAT_COMPLETIONS.
+    def __init__(self, latencia=0.05, variacao=0.02, taxa_429=0.0, retry_after=0.1, porta=0, semente=7, trechos=20,
+                 falhas_stream=()):
+        self.trechos = trechos
+        self.falhas_stream = list(falhas_stream)
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_429 = taxa_429
+        self.retry_after = retry_after
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+        self.respostas_429 = 0
+        self._servidor = _ServidorHTTP(("127.0.0.1", porta), self._criar_handler())
+        self._thread = None
+
+    @property
+    def url_base(self):
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}/v1"
+
+    def _sortear(self):
+        with self._lock:
+            self.requisicoes += 1
+            limitar = self._rng.random() < self.taxa_429
+            if limitar:
+                self.respostas_429 += 1
+            atraso = max(0.0, self._rng.uniform(self.latencia - self.variacao, self.latencia + self.variacao))
+            indice = self.requisicoes
+            resposta = gerar_resposta(indice, self._rng)
+        return limitar, atraso, resposta
+
+    def _proxima_falha_stream(self):
+        with self._lock:
+            return self.falhas_stream.pop(0) if self.falhas_stream else None
+
+    def _criar_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 com Transfer-Encoding chunked no streaming, como a API: cada evento chega ao cliente
+            # assim que é enviado, sem depender do fechamento da conexão
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, corpo, cabecalhos=()):
+                dados = json.dumps(corpo).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                for nome, valor in cabecalhos:
+                    self.send_header(nome, valor)
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def _enviar_trecho(self, dados):
+                self.wfile.write(f"{len(dados):x}\r\n".encode("ascii") + dados + b"\r\n")
+                self.wfile.flush()
+
+            def _enviar_evento(self, dados):
+                self._enviar_trecho(f"data: {json.dumps(dados) if not isinstance(dados, str) else dados}\n\n".encode("utf-8"))
+
+            def _responder_stream(self, modelo, resposta, atraso, uso):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                tamanho = max(1, -(-len(resposta) // servidor.trechos))
+                pedacos = [resposta[i:i + tamanho] for i in range(0, len(resposta), tamanho)]
+                falha = servidor._proxima_falha_stream()
+                for i, pedaco in enumerate(pedacos):
+                    if falha and i == len(pedacos) // 2:
+                        if falha == "erro":
+                            self._enviar_evento({"error": {"message": "The server had an error while processing your request.",
+                                                           "type": "server_error"}})
+                        self.wfile.write(b"0\r\n\r\n")
+                        self.wfile.flush()
+                        return
+                    time.sleep(atraso / len(pedacos))
+                    self._enviar_evento({"object": "chat.completion.chunk", "model": modelo,
+                                         "choices": [{"index": 0, "delta": {"content": pedaco},
+                                                      "finish_reason": "stop" if i == len(pedacos) - 1 else None}]})
+                self._enviar_evento({"object": "chat.completion.chunk", "model": modelo, "choices": [], "usage": uso})
+                self._enviar_evento("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._responder(404, {"error": {"message": f"Rota desconhecida: {self.path}"}})
+                    return
+                limitar, atraso, resposta = servidor._sortear()
+                if limitar:
+                    self._responder(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                    [("Retry-After", str(servidor.retry_after))])
+                    return
+                prompt = "".join(m.get("content") or "" for m in corpo.get("messages", []))
+                tokens_prompt = len(prompt) // 4
+                tokens_resposta = len(resposta) // 4
+                uso = {"prompt_tokens": tokens_prompt, "completion_tokens": tokens_resposta,
+                       "total_tokens": tokens_prompt + tokens_resposta}
+                if corpo.get("stream"):
+                    self._responder_stream(corpo.get("model"), resposta, atraso, uso)
+                    return
+                time.sleep(atraso)
+                self._responder(200, {
+                    "id": f"chatcmpl-mock-{servidor.requisicoes}",
+                    "object": "chat.completion",
+                    "model": corpo.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": resposta}, "finish_reason": "stop"}],
+                    "usage": uso,
+                })
+
+        return Handler
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="servidor-mock", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita /v1/chat/completions.")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência média por resposta (s)")
+    parser.add_argument("--variacao", type=float, default=0.2, help="Variação da latência (± s)")
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração das requisições respondidas com 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Valor do cabeçalho Retry-After (s)")
+    parser.add_argument("--trechos", type=int, default=20, help="Eventos SSE por resposta em streaming")
+    args = parser.parse_args()
+
+    servidor = ServidorMock(args.latencia, args.variacao, args.taxa_429, args.retry_after, args.porta,
+                            trechos=args.trechos)
+    print(f"Servindo em {servidor.url_base} (use OPENAI_BASE_URL={servidor.url_base})")
+    try:
+        servidor._servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
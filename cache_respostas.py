@@ -0,0 +1,105 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CAMINHO_CACHE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "respostas_gpt.sqlite3")
+
+
+def chave_cache(prompt_text, modelo, temperatura):
+    bruto = f"{modelo}\x00{temperatura!r}\x00{prompt_text}".encode("utf-8")
+    return hashlib.sha256(bruto).hexdigest()
+
+
+# ==============================================================================
+# CACHE PERSISTENTE DE RESPOSTAS (SQLITE)
+# ==============================================================================
+class CacheRespostas:
+    # Cache endereçado por conteúdo: hash(prompt, modelo, temperatura) -> resposta
+    INTERVALO_LIMPEZA = 50
+
+    def __init__(self, caminho=CAMINHO_CACHE_PADRAO, idade_maxima_dias=30, tamanho_maximo_mb=200):
+        self.caminho = caminho
+        self.idade_maxima = idade_maxima_dias * 86400 if idade_maxima_dias else None
+        self.tamanho_maximo = int(tamanho_maximo_mb * 1024 * 1024) if tamanho_maximo_mb else None
+        self._lock = threading.Lock()
+        self._gravacoes = 0
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS respostas ("
+                " chave TEXT PRIMARY KEY,"
+                " modelo TEXT NOT NULL,"
+                " resposta TEXT NOT NULL,"
+                " tamanho INTEGER NOT NULL,"
+                " criado_em REAL NOT NULL,"
+                " acessado_em REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas (acessado_em)")
+
+    def _conectar(self):
+        # Conexão curta por operação: o cache é usado a partir das threads do despachante
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def obter(self, prompt_text, modelo, temperatura):
+        chave = chave_cache(prompt_text, modelo, temperatura)
+        agora = time.time()
+        with self._conectar() as conn:
+            linha = conn.execute("SELECT resposta, criado_em FROM respostas WHERE chave = ?", (chave,)).fetchone()
+            if linha is None:
+                return None
+            resposta, criado_em = linha
+            if self.idade_maxima and agora - criado_em > self.idade_maxima:
+                conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                return None
+            conn.execute("UPDATE respostas SET acessado_em = ? WHERE chave = ?", (agora, chave))
+        return resposta
+
+    def gravar(self, prompt_text, modelo, temperatura, resposta):
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respostas (chave, modelo, resposta, tamanho, criado_em, acessado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (chave_cache(prompt_text, modelo, temperatura), modelo, resposta,
+                 len(resposta.encode("utf-8")), agora, agora),
+            )
+        # Os limites de idade e tamanho são aplicados na primeira gravação e depois a cada INTERVALO_LIMPEZA
+        with self._lock:
+            limpar = self._gravacoes % self.INTERVALO_LIMPEZA == 0
+            self._gravacoes += 1
+        if limpar:
+            self.remover_excedentes()
+
+    def remover(self, prompt_text, modelo, temperatura):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM respostas WHERE chave = ?", (chave_cache(prompt_text, modelo, temperatura),))
+
+    def remover_excedentes(self):
+        with self._conectar() as conn:
+            if self.idade_maxima:
+                conn.execute("DELETE FROM respostas WHERE criado_em < ?", (time.time() - self.idade_maxima,))
+            if self.tamanho_maximo:
+                total = conn.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+                if total > self.tamanho_maximo:
+                    # Remove os menos acessados recentemente até caber no limite
+                    excedente = total - self.tamanho_maximo
+                    removido = 0
+                    chaves = []
+                    for chave, tamanho in conn.execute("SELECT chave, tamanho FROM respostas ORDER BY acessado_em"):
+                        if removido >= excedente:
+                            break
+                        chaves.append((chave,))
+                        removido += tamanho
+                    conn.executemany("DELETE FROM respostas WHERE chave = ?", chaves)
+
+    def estatisticas(self):
+        with self._conectar() as conn:
+            qtd, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()
+        return {"registros": qtd, "tamanho_mb": total / (1024 * 1024)}
+
+    def limpar(self):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM respostas")
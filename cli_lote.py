@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from cache_respostas import CacheRespostas
+from cliente_gpt import LimitadorTaxa
+from motor import CamposAusentes, executar_lote, gravar_prompts, preparar_prompts
+from orcamento import contar_tokens_prompts, estimar_lote
+from saida_lote import ArmazemRespostas, ZipIncremental
+from telemetria import Telemetria
+from template_prompt import TEMPLATE_PADRAO
+from unificador import LINHA_CABECALHO, LINHAS_TESTE, processar_cpfs
+
+
+def carregar_entrada(caminho, aba=None, bruto=False, telemetria=None):
+    # bruto=True: exportação da planilha de origem (cabeçalho deslocado, linhas de teste, várias submissões por CPF)
+    telemetria = telemetria or Telemetria()
+    opcoes = {"header": LINHA_CABECALHO} if bruto else {}
+    with telemetria.etapa("leitura_entrada"):
+        if caminho.lower().endswith(".csv"):
+            df = pd.read_csv(caminho, **opcoes)
+        else:
+            df = pd.read_excel(caminho, sheet_name=aba if aba is not None else (0 if bruto else "dupar"), **opcoes)
+    if bruto:
+        with telemetria.etapa("processar_cpfs"):
+            df = processar_cpfs(df.iloc[LINHAS_TESTE:].reset_index(drop=True))
+    return df
+
+
+def gravar_metricas(telemetria, caminho):
+    # Extensão .prom: formato texto do Prometheus; qualquer outra: JSON
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(telemetria.exportar_prometheus() if caminho.endswith(".prom") else telemetria.exportar_json())
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description="Gera relatórios DUPAR em lote (ETL -> prompts -> GPT -> DOCX) sem a interface Streamlit."
+    )
+    parser.add_argument("entrada", help="Planilha de entrada (.xlsx ou .csv)")
+    parser.add_argument("-o", "--saida", required=True, help="Diretório onde prompts.zip e respostas_docx.zip serão gravados")
+    parser.add_argument("--aba", help="Aba do .xlsx (padrão: 'dupar', ou a primeira com --bruto)")
+    parser.add_argument("--bruto", action="store_true", help="A entrada é a exportação da planilha de origem; aplica a unificação por CPF")
+    parser.add_argument("--template", help="Arquivo .txt de template (padrão: template embutido)")
+    parser.add_argument("--colunas", nargs="+", help="Colunas disponíveis ao template (padrão: todas)")
+    parser.add_argument("--permitir-campos-ausentes", action="store_true",
+                        help="Gera mesmo que o template use campos sem coluna na planilha (ficam vazios)")
+    parser.add_argument("--modelo", default="gpt-3.5-turbo")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Requisições simultâneas à API")
+    parser.add_argument("--rpm", type=int, default=500, help="Requisições por minuto (0 = sem limite)")
+    parser.add_argument("--tpm", type=int, default=200000, help="Tokens por minuto (0 = sem limite)")
+    parser.add_argument("--docx-base", help="Documento .docx com a identidade visual usado como base dos relatórios")
+    parser.add_argument("--processos", type=int, default=None, help="Processos para gerar DOCX (padrão: nº de CPUs; 0 = sem pool)")
+    parser.add_argument("--ignorar-cache", action="store_true", help="Reenvia todos os prompts (o cache é apenas atualizado)")
+    parser.add_argument("--somente-prompts", action="store_true", help="Gera apenas prompts.zip, sem chamar a API")
+    parser.add_argument("--metricas", help="Grava as métricas da execução (.json, ou .prom para o formato do Prometheus)")
+    return parser
+
+
+def executar(args, template_texto, telemetria):
+    df = carregar_entrada(args.entrada, args.aba, args.bruto, telemetria)
+    os.makedirs(args.saida, exist_ok=True)
+
+    try:
+        with telemetria.etapa("preparar_prompts"):
+            prompts = preparar_prompts(df, template_texto, args.colunas, args.permitir_campos_ausentes)
+    except CamposAusentes as e:
+        print(f"{e}. Corrija o template ou use --permitir-campos-ausentes.", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(f"Template inválido: {e}", file=sys.stderr)
+        return 2
+    with telemetria.etapa("gravar_prompts_zip"):
+        gravar_prompts(prompts, ZipIncremental(caminho=os.path.join(args.saida, "prompts.zip")))
+    print(f"{len(prompts)} prompts gravados em {os.path.join(args.saida, 'prompts.zip')}")
+
+    estimativa = estimar_lote(prompts, args.modelo, contar_tokens_prompts(prompts, args.modelo),
+                              max_concorrencia=args.concorrencia, rpm=args.rpm, tpm=args.tpm)
+    custo = f"US$ {estimativa['custo_usd']:.2f}" if estimativa['custo_usd'] is not None else "n/d"
+    print(f"Estimativa: {estimativa['tokens_entrada']} tokens de entrada + {estimativa['tokens_saida']} de saída, custo ≈ {custo}")
+    acima_do_limite = set(estimativa['acima_do_limite'])
+    if acima_do_limite:
+        for item in prompts:
+            if item['id'] in acima_do_limite:
+                print(f"  ignorado (excede {estimativa['limite_contexto']} tokens de contexto): {item['nome']}", file=sys.stderr)
+        prompts = [p for p in prompts if p['id'] not in acima_do_limite]
+    if args.somente_prompts:
+        return 0
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("Defina a variável de ambiente OPENAI_API_KEY.", file=sys.stderr)
+        return 2
+
+    def mostrar_progresso(registro, concluidos, total):
+        print(f"[{concluidos}/{total}] {'ERRO' if registro['erro'] else 'ok  '} {registro['nome']}", flush=True)
+
+    armazem = ArmazemRespostas(caminho_zip=os.path.join(args.saida, "respostas_docx.zip"))
+    registros = executar_lote(
+        api_key,
+        prompts,
+        armazem,
+        modelo=args.modelo,
+        max_concorrencia=args.concorrencia,
+        limitador=LimitadorTaxa(rpm=args.rpm, tpm=args.tpm),
+        cache=CacheRespostas(),
+        ler_cache=not args.ignorar_cache,
+        processos=args.processos,
+        caminho_docx_base=args.docx_base,
+        ao_concluir=mostrar_progresso,
+        telemetria=telemetria,
+    )
+    armazem.zip.fechar()
+
+    resumo = telemetria.resumo()
+    contadores = resumo["contadores"]
+    if resumo["requisicoes"]["total"]:
+        print(f"Requisições: {resumo['requisicoes']['total']} · p50 {resumo['requisicoes']['latencia_p50']:.2f}s"
+              f" · p95 {resumo['requisicoes']['latencia_p95']:.2f}s · 429: {contadores.get('respostas_429', 0)}"
+              f" · tokens: {contadores.get('tokens_prompt', 0)} prompt / {contadores.get('tokens_resposta', 0)} resposta")
+
+    falhas = [r for r in registros if r['erro']]
+    print(f"{len(registros) - len(falhas)} relatórios gerados, {len(falhas)} com erro.")
+    for r in falhas:
+        print(f"  {r['nome']}: {armazem.ler(r['id'])[:200]}", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+
+    template_texto = TEMPLATE_PADRAO
+    if args.template:
+        with open(args.template, encoding="utf-8") as f:
+            template_texto = f.read()
+
+    telemetria = Telemetria()
+    try:
+        return executar(args, template_texto, telemetria)
+    finally:
+        if args.metricas:
+            gravar_metricas(telemetria, args.metricas)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
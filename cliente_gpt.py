@@ -0,0 +1,305 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# OPENAI_BASE_URL permite apontar para um proxy/gateway compatível (mesma variável do SDK oficial)
+URL_CHAT_COMPLETIONS = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
+MAX_TENTATIVAS = 5
+TIMEOUT_REQUISICAO = 60
+# Streaming: prazo para abrir a conexão e prazo máximo sem receber nenhum trecho
+TIMEOUT_CONEXAO = 10
+TIMEOUT_OCIOSO = 30
+TEMPERATURA = 0.7
+
+# Reserva de tokens de saída contabilizada no TPM (a OpenAI conta prompt + resposta)
+RESERVA_TOKENS_RESPOSTA = 1000
+
+# Prefixos das mensagens gravadas no lugar da resposta quando a chamada (chamar_gpt) ou a geração do DOCX falha
+PREFIXOS_ERRO = ("Erro na API", "Erro fatal", "Erro ao gerar DOCX")
+
+_local = threading.local()
+
+
+class LoteCancelado(Exception):
+    # Levantada quando o operador cancela o lote; o registro não conta como falha e volta para a fila
+    pass
+
+
+class StreamIncompleto(Exception):
+    # O stream terminou sem "[DONE]"/finish_reason ou trouxe um evento de erro: a resposta parcial é descartada
+    pass
+
+
+def _sessao_http():
+    # Uma sessão por thread: reaproveita conexões TLS sem compartilhar estado entre threads
+    sessao = getattr(_local, "sessao", None)
+    if sessao is None:
+        sessao = requests.Session()
+        _local.sessao = sessao
+    return sessao
+
+
+def eh_erro(resposta):
+    return resposta.startswith(PREFIXOS_ERRO)
+
+
+def texto_cache(prompt_text, instrucoes=None):
+    # Texto que identifica a chamada no cache de respostas
+    return f"{instrucoes}\x00{prompt_text}" if instrucoes else prompt_text
+
+
+def estimar_tokens(texto):
+    # Aproximação usual de ~4 caracteres por token
+    return max(1, len(texto) // 4)
+
+
+def tempo_retry_after(response, tentativa):
+    valor = response.headers.get("Retry-After")
+    if valor:
+        try:
+            return max(0.0, float(valor))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    # Sem Retry-After: backoff exponencial limitado
+    return min(2 ** tentativa, 30)
+
+
+# ==============================================================================
+# LIMITADOR DE TAXA (TOKEN BUCKET RPM/TPM)
+# ==============================================================================
+class LimitadorTaxa:
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm or None
+        self.tpm = tpm or None
+        self._lock = threading.Lock()
+        self._req_disponiveis = float(self.rpm or 0)
+        self._tok_disponiveis = float(self.tpm or 0)
+        self._ultimo = time.monotonic()
+        self._pausado_ate = 0.0
+
+    def _reabastecer(self, agora):
+        decorrido = agora - self._ultimo
+        self._ultimo = agora
+        if self.rpm:
+            self._req_disponiveis = min(self.rpm, self._req_disponiveis + decorrido * self.rpm / 60.0)
+        if self.tpm:
+            self._tok_disponiveis = min(self.tpm, self._tok_disponiveis + decorrido * self.tpm / 60.0)
+
+    def adquirir(self, tokens=0):
+        if self.tpm:
+            # Um pedido maior que o balde inteiro nunca caberia; limita ao tamanho do balde
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._reabastecer(agora)
+                espera = self._pausado_ate - agora
+                if espera <= 0:
+                    falta_req = 1 - self._req_disponiveis if self.rpm else 0
+                    falta_tok = tokens - self._tok_disponiveis if self.tpm else 0
+                    if falta_req <= 0 and falta_tok <= 0:
+                        if self.rpm:
+                            self._req_disponiveis -= 1
+                        if self.tpm:
+                            self._tok_disponiveis -= tokens
+                        return
+                    espera = max(
+                        falta_req * 60.0 / self.rpm if falta_req > 0 else 0,
+                        falta_tok * 60.0 / self.tpm if falta_tok > 0 else 0,
+                    )
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        # Após um 429 todas as threads aguardam, não só a que recebeu o erro
+        with self._lock:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+
+
+# ==============================================================================
+# CHAMADAS À API
+# ==============================================================================
+def montar_mensagens(prompt_text, instrucoes=None):
+    # Instruções fixas como mensagem de sistema: o prefixo idêntico entre chamadas é cacheado pelo provedor
+    mensagens = [{"role": "system", "content": instrucoes}] if instrucoes else []
+    return mensagens + [{"role": "user", "content": prompt_text}]
+
+
+def _verificar_cancelamento(cancelar):
+    if cancelar is not None and cancelar.is_set():
+        raise LoteCancelado()
+
+
+def _ler_stream(response, inicio, ao_receber=None, cancelar=None, telemetria=None):
+    # Eventos SSE "data: {...}" até "data: [DONE]"; o último evento traz o bloco usage (include_usage).
+    # Só é aceito o stream que chegou ao fim ("[DONE]" ou finish_reason); `inicio` é o instante do envio.
+    response.encoding = "utf-8"
+    texto = ""
+    finalizado = False
+    for linha in response.iter_lines(decode_unicode=True):
+        if cancelar is not None and cancelar.is_set():
+            response.close()
+            raise LoteCancelado()
+        if not linha or not linha.startswith("data:"):
+            continue
+        dado = linha[5:].strip()
+        if dado == "[DONE]":
+            finalizado = True
+            break
+        evento = json.loads(dado)
+        if evento.get("error"):
+            erro = evento["error"]
+            raise StreamIncompleto(f"erro no stream: {erro.get('message', erro) if isinstance(erro, dict) else erro}")
+        if evento.get("usage") and telemetria is not None:
+            telemetria.registrar_uso(evento["usage"])
+        for escolha in evento.get("choices") or []:
+            trecho = (escolha.get("delta") or {}).get("content")
+            if trecho:
+                if not texto and telemetria is not None:
+                    telemetria.registrar_etapa("gpt_primeiro_trecho", time.perf_counter() - inicio)
+                texto += trecho
+                if ao_receber is not None:
+                    ao_receber(texto)
+            if escolha.get("finish_reason"):
+                finalizado = True
+    if not finalizado:
+        raise StreamIncompleto("conexão encerrada antes do fim da resposta")
+    return texto
+
+
+def chamar_gpt(api_key, prompt_text, modelo="gpt-3.5-turbo", limitador=None, cache=None, ler_cache=True,
+               telemetria=None, instrucoes=None, stream=False, ao_receber=None, cancelar=None,
+               timeout_ocioso=TIMEOUT_OCIOSO):
+    # Com ler_cache=False a resposta é sempre buscada na API e o cache é apenas atualizado.
+    # stream=True: a resposta chega em trechos (`ao_receber(texto_parcial)` a cada trecho) e o limite de
+    # tempo vale entre trechos, não para a geração inteira. `cancelar` (threading.Event) interrompe a chamada.
+    chave_texto = texto_cache(prompt_text, instrucoes)
+    if cache is not None and ler_cache:
+        em_cache = cache.obter(chave_texto, modelo, TEMPERATURA)
+        if em_cache is not None:
+            if telemetria is not None:
+                telemetria.incrementar("cache_acertos")
+            return em_cache
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": modelo,
+        "messages": montar_mensagens(prompt_text, instrucoes),
+        "temperature": TEMPERATURA
+    }
+    if stream:
+        data["stream"] = True
+        data["stream_options"] = {"include_usage": True}
+    timeout = (TIMEOUT_CONEXAO, timeout_ocioso) if stream else TIMEOUT_REQUISICAO
+    tokens_estimados = estimar_tokens(prompt_text) + estimar_tokens(instrucoes or "") + RESERVA_TOKENS_RESPOSTA
+    try:
+        for tentativa in range(MAX_TENTATIVAS):
+            _verificar_cancelamento(cancelar)
+            if limitador is not None:
+                limitador.adquirir(tokens_estimados)
+                _verificar_cancelamento(cancelar)
+            if tentativa and telemetria is not None:
+                telemetria.incrementar("retentativas")
+            inicio = time.perf_counter()
+            response = None
+            try:
+                response = _sessao_http().post(URL_CHAT_COMPLETIONS, headers=headers, json=data, timeout=timeout, stream=stream)
+                # Em streaming com sucesso a latência só é registrada quando a geração termina
+                if telemetria is not None and not (stream and response.status_code == 200):
+                    telemetria.registrar_requisicao(time.perf_counter() - inicio, response.status_code)
+                if response.status_code == 429:
+                    if telemetria is not None:
+                        telemetria.incrementar("respostas_429")
+                    if tentativa == MAX_TENTATIVAS - 1:
+                        break
+                    espera = tempo_retry_after(response, tentativa)
+                    if limitador is not None:
+                        limitador.pausar(espera)
+                    else:
+                        time.sleep(espera)
+                    continue
+                response.raise_for_status()
+                if stream:
+                    conteudo = _ler_stream(response, inicio, ao_receber, cancelar, telemetria)
+                    if telemetria is not None:
+                        telemetria.registrar_requisicao(time.perf_counter() - inicio, response.status_code)
+                else:
+                    corpo = response.json()
+                    conteudo = corpo['choices'][0]['message']['content']
+                    if telemetria is not None:
+                        telemetria.registrar_uso(corpo.get('usage'))
+                if cache is not None:
+                    cache.gravar(chave_texto, modelo, TEMPERATURA, conteudo)
+                return conteudo
+            except requests.exceptions.HTTPError:
+                if telemetria is not None:
+                    telemetria.incrementar("falhas")
+                return f"Erro na API (HTTP {response.status_code}): {response.text}"
+            except LoteCancelado:
+                if telemetria is not None and response is not None and stream:
+                    telemetria.incrementar("streams_cancelados")
+                raise
+            except Exception:
+                if telemetria is not None:
+                    if response is None:
+                        telemetria.registrar_requisicao(time.perf_counter() - inicio, "conexao")
+                    elif stream:
+                        # Conexão caiu ou ficou ociosa além do limite no meio da geração
+                        telemetria.incrementar("streams_interrompidos")
+                if tentativa == MAX_TENTATIVAS - 1: raise
+                time.sleep(1)
+        if telemetria is not None:
+            telemetria.incrementar("falhas")
+        return f"Erro na API (HTTP 429): limite de requisições excedido após {MAX_TENTATIVAS} tentativas."
+    except LoteCancelado:
+        raise
+    except Exception as e:
+        if telemetria is not None:
+            telemetria.incrementar("falhas")
+        return f"Erro fatal na conexão: {e}"
+
+
+def processar_em_lote(api_key, itens, modelo="gpt-3.5-turbo", max_concorrencia=4, limitador=None, ao_concluir=None,
+                      cache=None, ler_cache=True, ao_iniciar=None, telemetria=None, stream=False, ao_receber=None,
+                      cancelar=None, timeout_ocioso=TIMEOUT_OCIOSO):
+    # Despacha os prompts em paralelo; `ao_concluir` roda na thread chamadora (seguro para o Streamlit),
+    # `ao_iniciar(item)` e `ao_receber(item, texto_parcial)` rodam na thread do pool.
+    # Com `cancelar` acionado, os itens ainda não concluídos ficam de fora do resultado.
+    respostas = {}
+    total = len(itens)
+
+    def executar(item):
+        _verificar_cancelamento(cancelar)
+        if ao_iniciar is not None:
+            ao_iniciar(item)
+        receber = (lambda texto: ao_receber(item, texto)) if ao_receber is not None else None
+        return chamar_gpt(api_key, item['conteudo'], modelo, limitador, cache, ler_cache, telemetria,
+                          item.get('instrucoes'), stream, receber, cancelar, timeout_ocioso)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_concorrencia))) as executor:
+        futuros = {executor.submit(executar, item): item for item in itens}
+        try:
+            for futuro in as_completed(futuros):
+                item = futuros[futuro]
+                try:
+                    respostas[item['id']] = futuro.result()
+                except LoteCancelado:
+                    continue
+                if ao_concluir is not None:
+                    ao_concluir(item, respostas[item['id']], len(respostas), total)
+        except BaseException:
+            # Falha em `ao_concluir` (ou interrupção): as chamadas ainda na fila não chegam a ir para a API
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return [(item, respostas[item['id']]) for item in sorted(itens, key=lambda p: p['id']) if item['id'] in respostas]
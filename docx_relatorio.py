@@ -0,0 +1,130 @@
+import io
+import re
+import threading
+
+from docx import Document
+from docx.oxml.ns import qn
+
+PADRAO_INLINE = re.compile(r'(\*\*.+?\*\*|\*[^*\s][^*]*?\*)')
+PADRAO_TITULO = re.compile(r'^(#{1,9})\s*(.*)$')
+PADRAO_NUMERADO = re.compile(r'^\d+[.)]\s+(.*)$')
+PADRAO_SEPARADOR_TABELA = re.compile(r'^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$')
+
+
+# ==============================================================================
+# FORMATAÇÃO INLINE
+# ==============================================================================
+def formatar_paragrafo(paragrafo, texto):
+    for parte in PADRAO_INLINE.split(texto):
+        if not parte:
+            continue
+        if parte.startswith('**') and parte.endswith('**') and len(parte) > 4:
+            paragrafo.add_run(parte[2:-2]).bold = True
+        elif parte.startswith('*') and parte.endswith('*') and len(parte) > 2:
+            paragrafo.add_run(parte[1:-1]).italic = True
+        else:
+            paragrafo.add_run(parte)
+
+
+def _celulas_tabela(linha):
+    return [c.strip() for c in linha.strip().strip('|').split('|')]
+
+
+# ==============================================================================
+# RENDERIZADOR COM DOCUMENTO BASE REAPROVEITADO
+# ==============================================================================
+class RenderizadorDocx:
+    # O documento base (padrão do python-docx ou um .docx com a identidade visual) é carregado uma vez;
+    # a cada relatório o corpo volta ao conteúdo original do modelo e o novo texto é inserido
+    def __init__(self, caminho_base=None):
+        self._doc = Document(caminho_base)
+        self._corpo = self._doc.element.body
+        self._elementos_base = set(self._corpo)
+        self._lock = threading.Lock()
+        # Resolve os ids de estilo uma vez: a busca por nome do python-docx percorre todos os estilos a cada parágrafo
+        ids_estilo = {s.name: s.style_id for s in self._doc.styles}
+        self._estilo_titulo = {n: ids_estilo.get(f'Heading {n}') for n in range(1, 10)}
+        self._estilo_marcador = ids_estilo.get('List Bullet')
+        self._estilo_numerado = ids_estilo.get('List Number')
+        self._estilo_tabela = ids_estilo.get('Table Grid')
+
+    def _limpar_corpo(self):
+        for elemento in list(self._corpo):
+            if elemento not in self._elementos_base and elemento.tag != qn('w:sectPr'):
+                self._corpo.remove(elemento)
+
+    def _paragrafo(self, estilo_id=None):
+        paragrafo = self._doc.add_paragraph()
+        if estilo_id:
+            paragrafo._p.style = estilo_id
+        return paragrafo
+
+    def _adicionar_tabela(self, linhas):
+        linhas = [l for l in linhas if not PADRAO_SEPARADOR_TABELA.match(l)]
+        if not linhas:
+            # Bloco só com separadores ("|---|---|"): nada a renderizar
+            return
+        celulas = [_celulas_tabela(l) for l in linhas]
+        colunas = max(len(c) for c in celulas)
+        tabela = self._doc.add_table(rows=len(celulas), cols=colunas)
+        if self._estilo_tabela:
+            tabela._tbl.tblStyle_val = self._estilo_tabela
+        for i, (linha_tabela, valores) in enumerate(zip(tabela.rows, celulas)):
+            for celula, valor in zip(linha_tabela.cells, valores):
+                paragrafo = celula.paragraphs[0]
+                formatar_paragrafo(paragrafo, valor)
+                if i == 0:
+                    for run in paragrafo.runs:
+                        run.bold = True
+
+    def _adicionar_linha(self, linha):
+        titulo = PADRAO_TITULO.match(linha)
+        if titulo:
+            self._paragrafo(self._estilo_titulo[len(titulo.group(1))]).add_run(titulo.group(2))
+            return
+        if linha.startswith('- ') or linha.startswith('* '):
+            formatar_paragrafo(self._paragrafo(self._estilo_marcador), linha[2:])
+            return
+        numerado = PADRAO_NUMERADO.match(linha) if self._estilo_numerado else None
+        if numerado:
+            formatar_paragrafo(self._paragrafo(self._estilo_numerado), numerado.group(1))
+            return
+        formatar_paragrafo(self._paragrafo(), linha)
+
+    def renderizar(self, texto_resposta):
+        with self._lock:
+            self._limpar_corpo()
+            bloco_tabela = []
+            for linha in texto_resposta.split('\n'):
+                linha = linha.strip()
+                # Linhas "| a | b |" consecutivas formam uma tabela
+                if linha.startswith('|'):
+                    bloco_tabela.append(linha)
+                    continue
+                if bloco_tabela:
+                    self._adicionar_tabela(bloco_tabela)
+                    bloco_tabela = []
+                if linha:
+                    self._adicionar_linha(linha)
+            if bloco_tabela:
+                self._adicionar_tabela(bloco_tabela)
+
+            buffer = io.BytesIO()
+            self._doc.save(buffer)
+        return buffer.getvalue()
+
+
+_renderizadores = {}
+_lock_renderizadores = threading.Lock()
+
+
+def obter_renderizador(caminho_base=None):
+    # Um renderizador por modelo base e por processo (os workers do pool carregam o seu uma única vez)
+    with _lock_renderizadores:
+        if caminho_base not in _renderizadores:
+            _renderizadores[caminho_base] = RenderizadorDocx(caminho_base)
+        return _renderizadores[caminho_base]
+
+
+def criar_docx_bytes(texto_resposta, caminho_base=None):
+    return obter_renderizador(caminho_base).renderizar(texto_resposta)
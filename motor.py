@@ -0,0 +1,140 @@
+import multiprocessing
+import re
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cliente_gpt import TEMPERATURA, TIMEOUT_OCIOSO, processar_em_lote, texto_cache
+from docx_relatorio import criar_docx_bytes
+from template_prompt import compilar_template
+
+
+# ==============================================================================
+# PROMPTS
+# ==============================================================================
+class CamposAusentes(ValueError):
+    # O template usa campos sem coluna na planilha; `campos` lista quais
+    def __init__(self, campos):
+        super().__init__("O template usa campos que não existem na planilha: " + ", ".join(campos))
+        self.campos = campos
+
+
+def nome_para_arquivo(nome):
+    return re.sub(r'[^a-zA-Z0-9\s]', '', nome).replace(' ', '_')
+
+
+def preparar_prompts(df, template_texto, colunas=None, permitir_ausentes=False):
+    # Campos do template sem coluna na planilha viram "" só com `permitir_ausentes`; senão CamposAusentes
+    template = compilar_template(template_texto)
+    faltantes = template.faltantes(df.columns)
+    if faltantes and not permitir_ausentes:
+        raise CamposAusentes(faltantes)
+    conteudos = template.renderizar_colunas(df, colunas)
+    if 'Nome' in df.columns:
+        nomes = df['Nome'].astype(str).tolist()
+    else:
+        nomes = [f"Registro {i+1}" for i in df.index]
+
+    return [
+        {
+            "id": i,
+            "nome": nome,
+            "nome_arquivo": nome_para_arquivo(nome),
+            "conteudo": conteudo,
+            "instrucoes": template.instrucoes,
+        }
+        for i, nome, conteudo in zip(df.index, nomes, conteudos)
+    ]
+
+
+def gravar_prompts(prompts, zip_saida):
+    # As instruções fixas são as mesmas em todos os prompts: vão uma única vez para o ZIP
+    if prompts and prompts[0].get('instrucoes'):
+        zip_saida.adicionar("_instrucoes_sistema.txt", prompts[0]['instrucoes'])
+    for item in prompts:
+        zip_saida.adicionar(f"{item['nome_arquivo']}_prompt.txt", item['conteudo'])
+    zip_saida.fechar()
+
+
+# ==============================================================================
+# LOTE GPT -> DOCX
+# ==============================================================================
+def _criar_docx_cronometrado(texto_resposta, caminho_docx_base):
+    # Mede no próprio worker: o tempo até o resultado chegar incluiria a fila do pool
+    inicio = time.perf_counter()
+    docx_bytes = criar_docx_bytes(texto_resposta, caminho_docx_base)
+    return docx_bytes, time.perf_counter() - inicio
+
+
+def _criar_pool_docx(processos):
+    if processos == 0:
+        return None
+    # "spawn": o processo pai (Streamlit) tem várias threads, o que torna o fork inseguro
+    return ProcessPoolExecutor(max_workers=processos or None, mp_context=multiprocessing.get_context("spawn"))
+
+
+def executar_lote(api_key, prompts, armazem, modelo="gpt-3.5-turbo", max_concorrencia=4, limitador=None,
+                  cache=None, ler_cache=True, processos=None, caminho_docx_base=None, ao_concluir=None, ao_iniciar=None,
+                  telemetria=None, stream=False, ao_receber=None, cancelar=None, timeout_ocioso=TIMEOUT_OCIOSO):
+    # Respostas chegam das threads do cliente GPT e seguem para um pool de processos (processos=0: DOCX
+    # na própria thread). `armazem.gravar(item, resposta, docx_bytes)` devolve o registro repassado a
+    # `ao_concluir(registro, concluidos, total)`, que roda na thread chamadora. Se o DOCX de um registro
+    # falhar, ele é gravado como erro (docx_bytes=None) e o lote segue.
+    gravados = []
+    pendentes = {}
+    total = len(prompts)
+    pool = _criar_pool_docx(processos)
+
+    def guardar(item, resposta, obter_docx):
+        try:
+            docx_bytes, segundos_docx = obter_docx()
+        except Exception as e:
+            if telemetria is not None:
+                telemetria.incrementar("falhas_docx")
+            # A resposta que não pôde ser convertida sai do cache: reprocessar a falha pede outra à API
+            if cache is not None:
+                cache.remover(texto_cache(item['conteudo'], item.get('instrucoes')), modelo, TEMPERATURA)
+            resposta, docx_bytes = f"Erro ao gerar DOCX: {e}", None
+        else:
+            if telemetria is not None:
+                telemetria.registrar_etapa("gerar_docx", segundos_docx)
+        registro = armazem.gravar(item, resposta, docx_bytes)
+        gravados.append(registro)
+        if ao_concluir is not None:
+            ao_concluir(registro, len(gravados), total)
+
+    def coletar(bloquear):
+        if not pendentes:
+            return
+        prontos, _ = wait(pendentes, timeout=None if bloquear else 0,
+                          return_when=ALL_COMPLETED if bloquear else FIRST_COMPLETED)
+        for futuro in prontos:
+            item, resposta = pendentes.pop(futuro)
+            guardar(item, resposta, futuro.result)
+
+    def resposta_recebida(item, resposta, _concluidos, _total):
+        if pool is None:
+            guardar(item, resposta, lambda: _criar_docx_cronometrado(resposta, caminho_docx_base))
+        else:
+            try:
+                futuro = pool.submit(_criar_docx_cronometrado, resposta, caminho_docx_base)
+            except Exception:
+                # Pool indisponível (ex.: BrokenProcessPool): o DOCX é gerado na própria thread
+                guardar(item, resposta, lambda: _criar_docx_cronometrado(resposta, caminho_docx_base))
+                return
+            pendentes[futuro] = (item, resposta)
+            coletar(bloquear=False)
+
+    inicio = time.perf_counter()
+    try:
+        processar_em_lote(api_key, prompts, modelo, max_concorrencia=max_concorrencia, limitador=limitador,
+                          ao_concluir=resposta_recebida, cache=cache, ler_cache=ler_cache, ao_iniciar=ao_iniciar,
+                          telemetria=telemetria, stream=stream, ao_receber=ao_receber, cancelar=cancelar,
+                          timeout_ocioso=timeout_ocioso)
+        coletar(bloquear=True)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if telemetria is not None:
+            telemetria.registrar_etapa("lote_gpt_docx", time.perf_counter() - inicio)
+
+    return sorted(gravados, key=lambda r: r['id'])
@@ -0,0 +1,112 @@
+import math
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # opcional: sem tiktoken a contagem é estimada (~4 caracteres por token)
+    tiktoken = None
+
+from cliente_gpt import RESERVA_TOKENS_RESPOSTA, estimar_tokens
+
+# Janela de contexto (tokens) por modelo
+LIMITES_CONTEXTO = {"gpt-3.5-turbo": 16_385, "gpt-4": 8_192, "gpt-4o": 128_000, "gpt-5.2": 400_000}
+LIMITE_CONTEXTO_PADRAO = 8_192
+
+# US$ por milhão de tokens: (entrada, entrada lida do cache de prefixo, saída). Valores de referência;
+# a interface permite ajustar conforme a tabela vigente do provedor
+PRECOS_POR_MILHAO = {
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-4o": (2.50, 1.25, 10.00),
+}
+# O provedor só reaproveita prefixos a partir deste tamanho
+MIN_TOKENS_CACHE_PREFIXO = 1024
+# Latência assumida por chamada enquanto não houver medições da telemetria
+LATENCIA_PADRAO = 20.0
+
+
+# ==============================================================================
+# CONTAGEM DE TOKENS
+# ==============================================================================
+@lru_cache(maxsize=8)
+def _codificador(modelo):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(modelo)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+    except Exception:
+        # Sem acesso aos arquivos de codificação (rede): volta para a estimativa
+        return None
+
+
+def contagem_exata(modelo):
+    return _codificador(modelo) is not None
+
+
+def contar_tokens(texto, modelo="gpt-3.5-turbo"):
+    codificador = _codificador(modelo)
+    if codificador is None:
+        return estimar_tokens(texto)
+    return len(codificador.encode(texto, disallowed_special=()))
+
+
+def contar_tokens_prompts(prompts, modelo):
+    # {id: tokens da mensagem do usuário}; as instruções fixas são contadas à parte, uma vez
+    return {p['id']: contar_tokens(p['conteudo'], modelo) for p in prompts}
+
+
+def limite_contexto(modelo):
+    return LIMITES_CONTEXTO.get(modelo, LIMITE_CONTEXTO_PADRAO)
+
+
+# ==============================================================================
+# ESTIMATIVA DE CUSTO E TEMPO DO LOTE
+# ==============================================================================
+def estimar_lote(prompts, modelo, tokens_por_id, max_concorrencia=1, rpm=None, tpm=None, latencia_media=None,
+                 tokens_resposta=RESERVA_TOKENS_RESPOSTA, precos=None, instrucoes=None):
+    # `precos` = (entrada, entrada em cache, saída) em US$/1M tokens; None usa PRECOS_POR_MILHAO.
+    # `instrucoes` = None as lê do primeiro prompt
+    if instrucoes is None:
+        instrucoes = prompts[0].get('instrucoes') if prompts else ""
+    tokens_instrucoes = contar_tokens(instrucoes, modelo) if instrucoes else 0
+    limite = limite_contexto(modelo)
+    quantidade = len(prompts)
+
+    tokens_entrada = sum(tokens_por_id[p['id']] for p in prompts) + quantidade * tokens_instrucoes
+    tokens_saida = quantidade * tokens_resposta
+    # A primeira chamada grava o prefixo (instruções); as seguintes o leem do cache se tiver o tamanho mínimo
+    tokens_cache = 0
+    if quantidade > 1 and tokens_instrucoes >= MIN_TOKENS_CACHE_PREFIXO:
+        tokens_cache = (quantidade - 1) * tokens_instrucoes
+
+    precos = precos if precos is not None else PRECOS_POR_MILHAO.get(modelo)
+    custo = None
+    if precos and any(precos):
+        preco_entrada, preco_cache, preco_saida = precos
+        custo = ((tokens_entrada - tokens_cache) * preco_entrada + tokens_cache * preco_cache
+                 + tokens_saida * preco_saida) / 1_000_000
+
+    # O lote é limitado pela concorrência (latência) ou pelos limites de taxa, o que for mais lento
+    segundos = math.ceil(quantidade / max(1, max_concorrencia)) * (latencia_media or LATENCIA_PADRAO)
+    if rpm:
+        segundos = max(segundos, quantidade / rpm * 60)
+    if tpm:
+        segundos = max(segundos, (tokens_entrada + tokens_saida) / tpm * 60)
+
+    return {
+        "prompts": quantidade,
+        "tokens_instrucoes": tokens_instrucoes,
+        "tokens_entrada": tokens_entrada,
+        "tokens_cache": tokens_cache,
+        "tokens_saida": tokens_saida,
+        "custo_usd": custo,
+        "segundos": segundos,
+        "limite_contexto": limite,
+        "acima_do_limite": [p['id'] for p in prompts
+                            if tokens_instrucoes + tokens_por_id[p['id']] + tokens_resposta > limite],
+    }
@@ -0,0 +1,374 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from gspread.exceptions import APIError
+from gspread.utils import ValueInputOption, ValueRenderOption, rowcol_to_a1
+from pandas.io.parsers import TextParser
+from streamlit_gsheets.gsheets_connection import GSheetsServiceAccountClient
+
+from unificador import LINHA_CABECALHO, LINHAS_TESTE, normalizar_cpf
+
+DIRETORIO_DADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CAMINHO_ESTADO_INGESTAO = os.path.join(DIRETORIO_DADOS, "ingestao_origem.json")
+CAMINHO_SNAPSHOT_ORIGEM = os.path.join(DIRETORIO_DADOS, "origem_limpa.pkl")
+
+# Permissão de um arquivo criado com open(): mkstemp cria com 0600. Lida uma vez (os.umask é global ao processo)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+MODO_ARQUIVO = 0o666 & ~_UMASK
+
+
+def _gravar_atomico(caminho, gravar):
+    diretorio = os.path.dirname(caminho) or "."
+    os.makedirs(diretorio, exist_ok=True)
+    # Nome temporário único: duas sessões gravando o mesmo arquivo não truncam o temporário uma da outra
+    descritor, temporario = tempfile.mkstemp(prefix=f".{os.path.basename(caminho)}.", suffix=".tmp", dir=diretorio)
+    os.close(descritor)
+    try:
+        gravar(temporario)
+        os.chmod(temporario, MODO_ARQUIVO)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+
+# ==============================================================================
+# LEITURA DA ORIGEM
+# ==============================================================================
+def ler_origem_a_partir_de(conn, spreadsheet, inicio):
+    # `inicio` = quantidade de linhas de dados (abaixo do cabeçalho) já ingeridas
+    if isinstance(conn.client, GSheetsServiceAccountClient):
+        # Conta de serviço: busca apenas o intervalo novo pela API do Sheets
+        worksheet = conn.client._select_worksheet(spreadsheet=spreadsheet)
+        cabecalho = worksheet.row_values(LINHA_CABECALHO + 1)
+        primeira_linha = LINHA_CABECALHO + 2 + inicio
+        intervalo = f"A{primeira_linha}:{rowcol_to_a1(worksheet.row_count, len(cabecalho))}"
+        valores = worksheet.get(intervalo) if primeira_linha <= worksheet.row_count else []
+        if not valores:
+            return pd.DataFrame(columns=cabecalho)
+        # A API devolve [] para linhas em branco: elas são mantidas (como na exportação CSV) para que
+        # cada linha lida corresponda a uma linha do DataFrame e a marca d'água avance o que foi buscado
+        return TextParser([cabecalho] + valores, header=0, skip_blank_lines=False).read()
+
+    # Planilha pública: a exportação CSV é integral, mas só as linhas novas são parseadas
+    pular = list(range(LINHA_CABECALHO + 1, LINHA_CABECALHO + 1 + inicio))
+    return conn.read(spreadsheet=spreadsheet, header=LINHA_CABECALHO, skiprows=pular, ttl=0)
+
+
+# ==============================================================================
+# INGESTÃO INCREMENTAL (MARCA D'ÁGUA)
+# ==============================================================================
+def carregar_estado_ingestao(caminho=CAMINHO_ESTADO_INGESTAO):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"linhas_lidas": 0}
+
+
+def carregar_snapshot_origem(caminho=CAMINHO_SNAPSHOT_ORIGEM):
+    try:
+        return pd.read_pickle(caminho)
+    except FileNotFoundError:
+        return None
+
+
+def ingerir_origem(ler_a_partir_de, ressincronizar=False,
+                   caminho_estado=CAMINHO_ESTADO_INGESTAO, caminho_snapshot=CAMINHO_SNAPSHOT_ORIGEM):
+    # Retorna (df_limpo, qtd_linhas_novas); `ler_a_partir_de(inicio)` devolve as linhas brutas a partir de `inicio`,
+    # uma linha do DataFrame por linha da planilha (inclusive as em branco)
+    snapshot = None if ressincronizar else carregar_snapshot_origem(caminho_snapshot)
+    estado = carregar_estado_ingestao(caminho_estado) if snapshot is not None else {"linhas_lidas": 0}
+    inicio = estado["linhas_lidas"]
+
+    novas = ler_a_partir_de(inicio)
+    # Descarta as linhas de teste que caírem dentro da janela lida e as linhas em branco
+    novas_limpas = novas.iloc[max(0, LINHAS_TESTE - inicio):].dropna(how="all")
+
+    if snapshot is None:
+        df_limpo = novas_limpas.reset_index(drop=True)
+    elif novas_limpas.empty:
+        df_limpo = snapshot
+    else:
+        df_limpo = pd.concat([snapshot, novas_limpas], ignore_index=True)
+
+    ultimo_termino = estado.get("ultimo_termino")
+    if "Horario de termino" in novas_limpas.columns:
+        terminos = novas_limpas["Horario de termino"].dropna()
+        if not terminos.empty:
+            ultimo_termino = str(terminos.iloc[-1])
+
+    _gravar_atomico(caminho_snapshot, df_limpo.to_pickle)
+    novo_estado = {
+        # Linhas buscadas na planilha, inclusive as em branco e as de teste descartadas
+        "linhas_lidas": inicio + len(novas),
+        "ultimo_termino": ultimo_termino,
+        "atualizado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    def gravar_estado(caminho):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(novo_estado, f, ensure_ascii=False, indent=2)
+
+    _gravar_atomico(caminho_estado, gravar_estado)
+    return df_limpo, len(novas_limpas)
+
+
+# ==============================================================================
+# PLANILHA MESTRA (SNAPSHOT LOCAL COM INVALIDAÇÃO POR REVISÃO)
+# ==============================================================================
+CAMINHO_SNAPSHOT_MESTRA = os.path.join(DIRETORIO_DADOS, "planilha_mestra.pkl")
+CAMINHO_META_MESTRA = os.path.join(DIRETORIO_DADOS, "planilha_mestra.json")
+
+# A consulta de revisão custa uma chamada HTTP: é feita no máximo uma vez por intervalo
+INTERVALO_VERIFICACAO_REVISAO = 60
+# Sem informação de revisão (planilha pública), o snapshot expira por idade
+IDADE_MAXIMA_SEM_REVISAO = 15 * 60
+
+_snapshots_em_memoria = {}
+
+
+def revisao_planilha(conn, spreadsheet):
+    # modifiedTime do Drive; só disponível com conta de serviço
+    if not isinstance(conn.client, GSheetsServiceAccountClient):
+        return None
+    planilha = conn.client._open_spreadsheet(spreadsheet=spreadsheet)
+    planilha.update_drive_metadata()
+    return planilha._properties.get("modifiedTime")
+
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _gravar_json(caminho, dados):
+    def gravar(temporario):
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+    _gravar_atomico(caminho, gravar)
+
+
+def _ler_snapshot(caminho):
+    # Reaproveita o DataFrame já desserializado enquanto o arquivo não mudar
+    versao = os.stat(caminho).st_mtime_ns
+    em_memoria = _snapshots_em_memoria.get(caminho)
+    if em_memoria is None or em_memoria[0] != versao:
+        em_memoria = (versao, pd.read_pickle(caminho))
+        _snapshots_em_memoria[caminho] = em_memoria
+    return em_memoria[1]
+
+
+def invalidar_planilha_mestra(caminho_meta=CAMINHO_META_MESTRA):
+    try:
+        os.remove(caminho_meta)
+    except FileNotFoundError:
+        pass
+
+
+def carregar_planilha_mestra(baixar, obter_revisao=None, forcar=False,
+                             caminho_snapshot=CAMINHO_SNAPSHOT_MESTRA, caminho_meta=CAMINHO_META_MESTRA):
+    # Retorna (df, meta). O DataFrame é compartilhado entre execuções: não deve ser alterado no lugar.
+    def consultar_revisao():
+        if obter_revisao is None:
+            return None
+        try:
+            return obter_revisao()
+        except Exception:
+            return None
+
+    agora = time.time()
+    meta = None if forcar else _ler_json(caminho_meta)
+    valido = meta is not None and os.path.exists(caminho_snapshot)
+
+    if valido and agora - meta.get("verificado_em", 0) > INTERVALO_VERIFICACAO_REVISAO:
+        revisao = consultar_revisao()
+        if revisao is not None and meta.get("revisao") is not None:
+            valido = revisao == meta["revisao"]
+        elif agora - meta["baixado_em"] > IDADE_MAXIMA_SEM_REVISAO:
+            valido = False
+        if valido:
+            meta["verificado_em"] = agora
+            _gravar_json(caminho_meta, meta)
+
+    if valido:
+        return _ler_snapshot(caminho_snapshot), meta
+
+    revisao = consultar_revisao()
+    df = baixar()
+    _gravar_atomico(caminho_snapshot, df.to_pickle)
+    meta = {"revisao": revisao, "baixado_em": agora, "verificado_em": agora}
+    _gravar_json(caminho_meta, meta)
+    return _ler_snapshot(caminho_snapshot), meta
+
+
+# ==============================================================================
+# GRAVAÇÃO INCREMENTAL DA PLANILHA MESTRA (DIFERENÇA POR CPF)
+# ==============================================================================
+# Células por chamada batch_update: mantém o payload bem abaixo do limite da API
+MAX_CELULAS_POR_CHAMADA = 20_000
+MAX_TENTATIVAS_GRAVACAO = 5
+# Status da API do Sheets que valem nova tentativa (cota e indisponibilidade)
+STATUS_RETENTATIVA = (429, 500, 502, 503)
+
+
+def _valor_celula(valor):
+    # Valor enviado com RAW: sem interpretação de datas/fórmulas, o que volta na leitura é o que foi gravado
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)) or valor is pd.NA or valor is pd.NaT:
+        return ""
+    if isinstance(valor, (bool, int, float, str)):
+        return valor
+    return str(valor)
+
+
+def _mesmo_valor(novo, atual):
+    numericos = (int, float)
+    if isinstance(novo, numericos) and isinstance(atual, numericos) and not isinstance(novo, bool):
+        return float(novo) == float(atual)
+    return novo == atual
+
+
+def calcular_diferencas(valores_atuais, df, chave="CPF"):
+    # `valores_atuais`: linhas da planilha (cabeçalho + dados). Retorna as linhas a atualizar
+    # [(número da linha, valores)], as novas e a contagem das inalteradas. `reescrever` indica que
+    # a diferença não se aplica (cabeçalho mudou, CPFs saíram ou repetidos) e a planilha deve ser regravada.
+    cabecalho = [str(c) for c in df.columns]
+    linhas_novas = [[_valor_celula(v) for v in linha] for linha in df.itertuples(index=False, name=None)]
+    diferencas = {"atualizar": [], "inserir": [], "inalteradas": 0, "removidas": 0, "reescrever": False,
+                  "cabecalho": cabecalho, "linhas": linhas_novas, "ultima_linha": 1}
+
+    cabecalho_atual = [str(c) for c in valores_atuais[0]] if valores_atuais else []
+    while cabecalho_atual and cabecalho_atual[-1] == "":
+        cabecalho_atual.pop()
+    if cabecalho_atual != cabecalho or chave not in cabecalho:
+        diferencas["reescrever"] = True
+        return diferencas
+
+    largura = len(cabecalho)
+    indice_chave = cabecalho.index(chave)
+    dados_atuais = [(linha + [""] * largura)[:largura] for linha in valores_atuais[1:]]
+    while dados_atuais and not any(v != "" for v in dados_atuais[-1]):
+        dados_atuais.pop()
+    diferencas["ultima_linha"] = len(dados_atuais) + 1
+    chaves_atuais = normalizar_cpf(pd.Series([l[indice_chave] for l in dados_atuais], dtype=object)).tolist()
+    chaves_novas = normalizar_cpf(pd.Series([l[indice_chave] for l in linhas_novas], dtype=object)).tolist()
+
+    posicoes = {}
+    for numero, cpf in enumerate(chaves_atuais, start=2):
+        if cpf is pd.NA or cpf in posicoes:
+            diferencas["reescrever"] = True
+            return diferencas
+        posicoes[cpf] = numero
+
+    vistos = set()
+    for cpf, linha in zip(chaves_novas, linhas_novas):
+        vistos.add(cpf)
+        numero = posicoes.get(cpf)
+        if numero is None:
+            diferencas["inserir"].append(linha)
+        elif all(_mesmo_valor(n, a) for n, a in zip(linha, dados_atuais[numero - 2])):
+            diferencas["inalteradas"] += 1
+        else:
+            diferencas["atualizar"].append((numero, linha))
+
+    diferencas["removidas"] = len(posicoes.keys() - vistos)
+    if diferencas["removidas"]:
+        # Remover linhas deslocaria as demais: nesse caso a planilha é regravada por inteiro
+        diferencas["reescrever"] = True
+    return diferencas
+
+
+def _agrupar_intervalos(linhas_numeradas, largura):
+    # Linhas consecutivas viram um único intervalo "A{i}:X{j}"
+    intervalos = []
+    for numero, valores in sorted(linhas_numeradas, key=lambda item: item[0]):
+        if intervalos and intervalos[-1]["fim"] == numero - 1:
+            intervalos[-1]["fim"] = numero
+            intervalos[-1]["values"].append(valores)
+        else:
+            intervalos.append({"inicio": numero, "fim": numero, "values": [valores]})
+    return [{"range": f"A{i['inicio']}:{rowcol_to_a1(i['fim'], largura)}", "values": i["values"]} for i in intervalos]
+
+
+def _dividir_em_chamadas(intervalos, largura, max_celulas):
+    # Quebra intervalos grandes e agrupa os pequenos em chamadas de até `max_celulas` células
+    max_linhas = max(1, max_celulas // max(1, largura))
+    chamadas, atual, celulas = [], [], 0
+    for intervalo in intervalos:
+        inicio = int(intervalo["range"].split(":")[0][1:])
+        valores = intervalo["values"]
+        for deslocamento in range(0, len(valores), max_linhas):
+            pedaco = valores[deslocamento:deslocamento + max_linhas]
+            primeira = inicio + deslocamento
+            if atual and celulas + len(pedaco) * largura > max_celulas:
+                chamadas.append(atual)
+                atual, celulas = [], 0
+            atual.append({"range": f"A{primeira}:{rowcol_to_a1(primeira + len(pedaco) - 1, largura)}", "values": pedaco})
+            celulas += len(pedaco) * largura
+    if atual:
+        chamadas.append(atual)
+    return chamadas
+
+
+def _com_retentativas(funcao, tentativas=MAX_TENTATIVAS_GRAVACAO):
+    for tentativa in range(tentativas):
+        try:
+            return funcao()
+        except APIError as e:
+            status = getattr(e.response, "status_code", None)
+            if status not in STATUS_RETENTATIVA or tentativa == tentativas - 1:
+                raise
+            time.sleep(min(2 ** tentativa, 30))
+
+
+def aplicar_diferencas(worksheet, diferencas, max_celulas=MAX_CELULAS_POR_CHAMADA):
+    # Retorna a quantidade de chamadas de escrita feitas à API
+    largura = len(diferencas["cabecalho"])
+    chamadas_feitas = 0
+    if diferencas["reescrever"]:
+        linhas = [(1, diferencas["cabecalho"])] + list(enumerate(diferencas["linhas"], start=2))
+        # Redimensionar descarta as linhas e colunas que sobrarem da versão anterior
+        _com_retentativas(lambda: worksheet.resize(rows=len(linhas), cols=largura))
+        chamadas_feitas += 1
+    else:
+        # Novas linhas entram logo após a última linha com dados
+        ultima = diferencas["ultima_linha"]
+        linhas = diferencas["atualizar"] + list(enumerate(diferencas["inserir"], start=ultima + 1))
+        faltam = ultima + len(diferencas["inserir"]) - worksheet.row_count
+        if faltam > 0:
+            _com_retentativas(lambda: worksheet.add_rows(faltam))
+            chamadas_feitas += 1
+
+    for chamada in _dividir_em_chamadas(_agrupar_intervalos(linhas, largura), largura, max_celulas):
+        _com_retentativas(lambda: worksheet.batch_update(chamada, value_input_option=ValueInputOption.raw))
+        chamadas_feitas += 1
+    return chamadas_feitas
+
+
+def gravar_planilha_mestra(conn, spreadsheet, df, chave="CPF"):
+    # Envia só as linhas novas/alteradas. Retorna {inseridas, atualizadas, inalteradas, removidas, reescrita, chamadas}
+    if not isinstance(conn.client, GSheetsServiceAccountClient):
+        # Sem conta de serviço não há acesso por intervalo: regrava a planilha inteira
+        conn.update(spreadsheet=spreadsheet, data=df)
+        return {"inseridas": len(df), "atualizadas": 0, "inalteradas": 0, "removidas": 0, "reescrita": True, "chamadas": 1}
+
+    worksheet = conn.client._select_worksheet(spreadsheet=spreadsheet)
+    valores_atuais = _com_retentativas(
+        lambda: worksheet.get_all_values(value_render_option=ValueRenderOption.unformatted))
+    diferencas = calcular_diferencas(valores_atuais, df, chave)
+    chamadas = 1 + aplicar_diferencas(worksheet, diferencas)
+    if diferencas["reescrever"]:
+        return {"inseridas": len(df), "atualizadas": 0, "inalteradas": 0, "removidas": diferencas["removidas"],
+                "reescrita": True, "chamadas": chamadas}
+    return {"inseridas": len(diferencas["inserir"]), "atualizadas": len(diferencas["atualizar"]),
+            "inalteradas": diferencas["inalteradas"], "removidas": 0, "reescrita": False, "chamadas": chamadas}
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+import zipfile
+
+from cliente_gpt import eh_erro
+
+# Acima deste tamanho o ZIP sai da memória e passa para um arquivo temporário em disco
+LIMITE_MEMORIA_PADRAO = 16 * 1024 * 1024
+
+
+# ==============================================================================
+# ZIP INCREMENTAL (SPOOLED)
+# ==============================================================================
+class ZipIncremental:
+    def __init__(self, limite_memoria=LIMITE_MEMORIA_PADRAO, caminho=None):
+        # Com `caminho` o ZIP é gravado direto no arquivo de destino (uso em lote/CLI)
+        if caminho:
+            self._arquivo = open(caminho, "w+b")
+        else:
+            self._arquivo = tempfile.SpooledTemporaryFile(max_size=limite_memoria, suffix=".zip")
+        self._zip = zipfile.ZipFile(self._arquivo, "w")
+        self._lock = threading.Lock()
+        self.quantidade = 0
+        self.fechado = False
+
+    def adicionar(self, nome, conteudo):
+        with self._lock:
+            self._zip.writestr(nome, conteudo)
+            self.quantidade += 1
+
+    def ler_bytes(self):
+        # Pode ser chamado durante a geração (download parcial): grava o diretório central,
+        # copia o conteúdo e reabre em modo "a", que continua a partir do diretório gravado
+        with self._lock:
+            if not self.fechado:
+                self._zip.close()
+            self._arquivo.seek(0)
+            dados = self._arquivo.read()
+            if not self.fechado:
+                self._zip = zipfile.ZipFile(self._arquivo, "a")
+        return dados
+
+    def fechar(self):
+        with self._lock:
+            if not self.fechado:
+                self._zip.close()
+                self._arquivo.flush()
+                self.fechado = True
+
+
+# ==============================================================================
+# ARMAZÉM DE RESPOSTAS DE UM LOTE
+# ==============================================================================
+class ArmazemRespostas:
+    # Texto das respostas em arquivos temporários + DOCX num ZipIncremental;
+    # o session_state guarda só este objeto e os metadados devolvidos por `gravar`
+    def __init__(self, limite_memoria=LIMITE_MEMORIA_PADRAO, caminho_zip=None):
+        self.diretorio = tempfile.mkdtemp(prefix="dupar_respostas_")
+        self.zip = ZipIncremental(limite_memoria, caminho_zip)
+        # Remove os temporários quando a sessão descarta o armazém
+        weakref.finalize(self, shutil.rmtree, self.diretorio, True)
+
+    def _caminho(self, id_registro):
+        return os.path.join(self.diretorio, f"{id_registro}.md")
+
+    def gravar(self, item, resposta, docx_bytes):
+        with open(self._caminho(item['id']), "w", encoding="utf-8") as f:
+            f.write(resposta)
+        if docx_bytes is not None:
+            self.zip.adicionar(f"RESPOSTA_{item['nome_arquivo']}.docx", docx_bytes)
+        return {"id": item['id'], "nome": item['nome'], "erro": eh_erro(resposta)}
+
+    def ler(self, id_registro):
+        with open(self._caminho(id_registro), encoding="utf-8") as f:
+            return f.read()
+
+
+# ==============================================================================
+# ARMAZÉM DE PROMPTS PREPARADOS
+# ==============================================================================
+class ArmazemPrompts:
+    # Texto de cada prompt em arquivos temporários e as instruções fixas uma única vez;
+    # o session_state guarda só este objeto e os metadados (id, nome, nome_arquivo) devolvidos por `gravar`
+    def __init__(self):
+        self.diretorio = tempfile.mkdtemp(prefix="dupar_prompts_")
+        self.instrucoes = None
+        weakref.finalize(self, shutil.rmtree, self.diretorio, True)
+
+    def _caminho(self, id_registro):
+        return os.path.join(self.diretorio, f"{id_registro}.txt")
+
+    def gravar(self, prompts):
+        if prompts:
+            self.instrucoes = prompts[0].get('instrucoes')
+        for item in prompts:
+            with open(self._caminho(item['id']), "w", encoding="utf-8") as f:
+                f.write(item['conteudo'])
+        return [{"id": item['id'], "nome": item['nome'], "nome_arquivo": item['nome_arquivo']} for item in prompts]
+
+    def ler(self, id_registro):
+        with open(self._caminho(id_registro), encoding="utf-8") as f:
+            return f.read()
+
+    def completos(self, metadados):
+        # Um prompt completo por vez, lido do disco (contagem de tokens e criação do lote)
+        for item in metadados:
+            yield {**item, "conteudo": self.ler(item['id']), "instrucoes": self.instrucoes}
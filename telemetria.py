@@ -0,0 +1,151 @@
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Limites (s) dos baldes do histograma de latência das requisições à API
+LIMITES_LATENCIA = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, math.inf)
+# Latências individuais mantidas para os percentis (as mais recentes)
+MAX_AMOSTRAS_LATENCIA = 10_000
+
+DESCRICOES_CONTADORES = {
+    "cache_acertos": "Respostas servidas pelo cache local.",
+    "retentativas": "Novas tentativas após 429 ou erro de conexão.",
+    "respostas_429": "Respostas 429 (limite de taxa) recebidas da API.",
+    "falhas": "Prompts que terminaram sem resposta válida.",
+    "falhas_docx": "Respostas que não puderam ser convertidas em DOCX.",
+    "streams_interrompidos": "Gerações em streaming interrompidas (queda, erro ou tempo ocioso) e reenviadas.",
+    "streams_cancelados": "Gerações em streaming abandonadas por cancelamento do lote.",
+    "tokens_prompt": "Tokens de prompt informados no bloco usage.",
+    "tokens_prompt_cache": "Tokens de prompt servidos pelo cache de prefixo do provedor.",
+    "tokens_resposta": "Tokens de resposta informados no bloco usage.",
+}
+
+
+def _percentil(ordenadas, fracao):
+    if not ordenadas:
+        return None
+    return ordenadas[min(len(ordenadas) - 1, int(fracao * len(ordenadas)))]
+
+
+def _formatar_limite(limite):
+    return "+Inf" if limite == math.inf else f"{limite:g}"
+
+
+# ==============================================================================
+# COLETOR DE MÉTRICAS
+# ==============================================================================
+class Telemetria:
+    # Duração por etapa, latência/status de cada requisição, contadores (retentativas, 429, cache)
+    # e tokens do bloco `usage`. Seguro para as threads do despachante.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self._lock:
+            self.iniciado_em = time.time()
+            self._etapas = {}
+            self._baldes = [0] * len(LIMITES_LATENCIA)
+            self._latencias = deque(maxlen=MAX_AMOSTRAS_LATENCIA)
+            self._soma_latencia = 0.0
+            self._por_status = {}
+            self._contadores = {}
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_etapa(nome, time.perf_counter() - inicio)
+
+    def registrar_etapa(self, nome, segundos):
+        with self._lock:
+            etapa = self._etapas.setdefault(nome, {"execucoes": 0, "segundos_total": 0.0, "ultima": 0.0})
+            etapa["execucoes"] += 1
+            etapa["segundos_total"] += segundos
+            etapa["ultima"] = segundos
+
+    def registrar_requisicao(self, segundos, status):
+        # status: código HTTP ou "conexao" quando não houve resposta
+        with self._lock:
+            for i, limite in enumerate(LIMITES_LATENCIA):
+                if segundos <= limite:
+                    self._baldes[i] += 1
+                    break
+            self._latencias.append(segundos)
+            self._soma_latencia += segundos
+            self._por_status[str(status)] = self._por_status.get(str(status), 0) + 1
+
+    def incrementar(self, nome, quantidade=1):
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + quantidade
+
+    def registrar_uso(self, uso):
+        # Bloco `usage` da resposta da API
+        if not uso:
+            return
+        self.incrementar("tokens_prompt", uso.get("prompt_tokens") or 0)
+        self.incrementar("tokens_prompt_cache", (uso.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+        self.incrementar("tokens_resposta", uso.get("completion_tokens") or 0)
+
+    def resumo(self):
+        with self._lock:
+            ordenadas = sorted(self._latencias)
+            total_requisicoes = sum(self._baldes)
+            return {
+                "iniciado_em": self.iniciado_em,
+                "etapas": {
+                    nome: {**e, "segundos_medio": e["segundos_total"] / e["execucoes"]}
+                    for nome, e in self._etapas.items()
+                },
+                "requisicoes": {
+                    "total": total_requisicoes,
+                    "por_status": dict(self._por_status),
+                    "latencia_media": self._soma_latencia / total_requisicoes if total_requisicoes else None,
+                    "latencia_p50": _percentil(ordenadas, 0.50),
+                    "latencia_p95": _percentil(ordenadas, 0.95),
+                    "latencia_p99": _percentil(ordenadas, 0.99),
+                    "latencia_max": ordenadas[-1] if ordenadas else None,
+                    "histograma": {_formatar_limite(l): n for l, n in zip(LIMITES_LATENCIA, self._baldes)},
+                },
+                "contadores": dict(self._contadores),
+            }
+
+    def exportar_json(self):
+        return json.dumps(self.resumo(), ensure_ascii=False, indent=2)
+
+    def exportar_prometheus(self, prefixo="dupar"):
+        resumo = self.resumo()
+        requisicoes = resumo["requisicoes"]
+        linhas = []
+
+        def metrica(nome, tipo, ajuda, amostras):
+            linhas.append(f"# HELP {prefixo}_{nome} {ajuda}")
+            linhas.append(f"# TYPE {prefixo}_{nome} {tipo}")
+            for sufixo, rotulos, valor in amostras:
+                texto_rotulos = ",".join(f'{k}="{v}"' for k, v in rotulos.items())
+                linhas.append(f"{prefixo}_{nome}{sufixo}{{{texto_rotulos}}} {valor:g}" if texto_rotulos
+                              else f"{prefixo}_{nome}{sufixo} {valor:g}")
+
+        metrica("etapa_segundos_total", "counter", "Tempo acumulado por etapa do pipeline.",
+                [("", {"etapa": n}, e["segundos_total"]) for n, e in resumo["etapas"].items()])
+        metrica("etapa_execucoes_total", "counter", "Execuções de cada etapa do pipeline.",
+                [("", {"etapa": n}, e["execucoes"]) for n, e in resumo["etapas"].items()])
+
+        acumulado = 0
+        baldes = []
+        for limite, quantidade in requisicoes["histograma"].items():
+            acumulado += quantidade
+            baldes.append(("_bucket", {"le": limite}, acumulado))
+        soma = (requisicoes["latencia_media"] or 0) * requisicoes["total"]
+        metrica("requisicao_latencia_segundos", "histogram", "Latência das requisições à API de chat.",
+                baldes + [("_sum", {}, soma), ("_count", {}, requisicoes["total"])])
+        metrica("requisicoes_total", "counter", "Requisições à API por status HTTP.",
+                [("", {"status": s}, n) for s, n in requisicoes["por_status"].items()])
+        for nome, valor in sorted(resumo["contadores"].items()):
+            metrica(f"{nome}_total", "counter", DESCRICOES_CONTADORES.get(nome, nome), [("", {}, valor)])
+        return "\n".join(linhas) + "\n"
@@ -0,0 +1,106 @@
+import re
+from functools import lru_cache
+from itertools import repeat
+
+import pandas as pd
+
+PADRAO_PLACEHOLDER = re.compile(r'\{\{([^{}]+)\}\}')
+
+# Linha que separa as instruções fixas (mensagem de sistema, idêntica em todas as chamadas e
+# aproveitada pelo cache de prompt do provedor) dos dados de cada pessoa (mensagem do usuário)
+MARCADOR_DADOS = "### DADOS ###"
+
+TEMPLATE_PADRAO = """Faça um relatório do modelo que estamos treinando com os seguintes itens: identificação (nome, cpf, e-mail, data do nascimento, naturalidade, objetivo de participação), registro de aplicação (identidade assistida ou nome, nome do aplicador, escolha da atividade - instrutor ou a própria pessoa, tempo dele resposta e data de aplicação, fractal de comportamento), registro de dados (fazer um quadro com as seguintes colunas e dados; numero de resposta, respostas, hierarquia e padrão de comportamento psicológico identificado), abaixo do quadro escreva um paragrafo sobre a interpretação do quadro de registro de dados, e a seguir outro paragrafo com as sugestões (habilidades a 
+desenvolver fundamentado no paragrafo da interpretação).
+
+cruze as informações levantadas e faça uma síntese em um paragrafo, dos padrões de comportamento psicológico recorrentes nas respostas dos três fractais.
+em seguida escreva um outro paragrafo de recomendação de desenvolvimento de habilidades.
+em seguida combinar as informações e categorizar como padrões de comportamento do usuário tem conteúdos definidos como: ● socialização: atributo relacionado com as interações do usuário com outros indivíduos, sejam familiares, amigos ou colegas de trabalho;
+● reflexão: atributo relacionado com a reflexão interior do usuário sobre as suas questões de vida e aspectos maiores do contexto no qual ele habita;
+● lazer: atributo relacionado com a realização de atividades que promovem o prazer e a felicidade do usuário, sejam elas ao ar livre ou em casa;
+● propósito: atributo relacionado com a motivação pessoal e os objetivos do usuário, ditando suas ambições, perspectivas de futuro e conquistas;
+● sentimento: atributo relacionado com o equilíbrio emocional do usuário e sua relação positiva com os aspectos sentimentais internos e externos;
+lazer, socialização, reflexão, propósito e sentimento numa métrica de 0 a 100%
+### DADOS ###
+utilize os dados a seguir:
+
+relatório 1: {{Horario de inicio}} {{Horario de termino}} {{Tempo de resposta}} {{Data de Aplicação}} {{Nome}} {{E-mail}} {{Naturalidade}} {{CPF}} {{Data de nascimento}} {{Objetivo}} {{Tipo de Aplicação}} {{Nome do Aplicador}}  {{Escolha da Atividade}} fractal de comportamento: 1- "{{Pergunta}}" {{RESPOSTA 1}} {{HIERAQUIA 1}} {{JUSTIFICATIVA 1}} {{RESPOSTA 2}} {{HIERAQUIA 2}} {{JUSTIFICATIVA 2}} {{RESPOSTA 3}} {{HIERAQUIA 3}} {{JUSTIFICATIVA 3}} {{FEEDBACK FINAL}}.
+
+relatório 2: {{Horario de inicio}} {{Horario de termino}} {{Tempo de resposta}} {{Data de Aplicação}} {{Nome}} {{E-mail}} {{Naturalidade}} {{CPF}} {{Data de nascimento}} {{Objetivo}} {{Tipo de Aplicação}} {{Nome do Aplicador}} {{Escolha da Atividade}} fractal de comportamento 2 - "{{Pergunta_2}}" {{RESPOSTA 1_2}} {{HIERAQUIA 1_2}} {{JUSTIFICATIVA 1_2}} {{RESPOSTA 2_2}} {{HIERAQUIA 2_2}} {{JUSTIFICATIVA 2_2}} {{RESPOSTA 3_2}} {{HIERAQUIA 3_2}} {{JUSTIFICATIVA 3_2}} {{FEEDBACK FINAL_2}}."""
+
+
+# ==============================================================================
+# TEMPLATE COMPILADO
+# ==============================================================================
+def texto_celula(valor):
+    # Única conversão célula -> texto dos dois caminhos de renderização: vazios (None/NaN/NaT) viram ""
+    # e datas saem como str(Timestamp), sem depender do tipo da coluna
+    return "" if valor is None or pd.isna(valor) else str(valor).strip()
+
+
+class TemplatePrompt:
+    # Antes de MARCADOR_DADOS ficam as `instrucoes` fixas (sem campos); o restante é dividido uma única vez
+    # em literais intercalados com variáveis:
+    # literais[0] {{variaveis[0]}} literais[1] ... {{variaveis[-1]}} literais[-1]
+    def __init__(self, texto):
+        self.texto = texto
+        self.instrucoes = ""
+        corpo = texto
+        if MARCADOR_DADOS in texto:
+            instrucoes, corpo = texto.split(MARCADOR_DADOS, 1)
+            if PADRAO_PLACEHOLDER.search(instrucoes):
+                raise ValueError(f"As instruções antes de '{MARCADOR_DADOS}' não podem conter campos {{{{...}}}}.")
+            self.instrucoes = instrucoes.strip()
+            corpo = corpo.lstrip("\n")
+        self.literais = []
+        self.variaveis = []
+        inicio = 0
+        for match in PADRAO_PLACEHOLDER.finditer(corpo):
+            self.literais.append(corpo[inicio:match.start()])
+            self.variaveis.append(match.group(1).strip())
+            inicio = match.end()
+        self.literais.append(corpo[inicio:])
+
+    @property
+    def placeholders(self):
+        return list(dict.fromkeys(self.variaveis))
+
+    def faltantes(self, colunas):
+        colunas = set(colunas)
+        return [v for v in self.placeholders if v not in colunas]
+
+    def renderizar(self, dados):
+        partes = [self.literais[0]]
+        for variavel, literal in zip(self.variaveis, self.literais[1:]):
+            partes.append(texto_celula(dados.get(variavel)))
+            partes.append(literal)
+        return "".join(partes)
+
+    def renderizar_colunas(self, df, colunas=None):
+        # Converte cada coluna usada para texto uma única vez e monta os prompts por junção;
+        # placeholders fora de `colunas` (ou vazios na planilha) são renderizados como ""
+        total = len(df)
+        permitidas = set(df.columns if colunas is None else colunas) & set(df.columns)
+        valores = {}
+        for variavel in self.placeholders:
+            if variavel in permitidas:
+                valores[variavel] = [texto_celula(valor) for valor in df[variavel].tolist()]
+
+        sequencias = [repeat(self.literais[0], total)]
+        for variavel, literal in zip(self.variaveis, self.literais[1:]):
+            coluna = valores.get(variavel)
+            sequencias.append(coluna if coluna is not None else repeat("", total))
+            sequencias.append(repeat(literal, total))
+        return ["".join(partes) for partes in zip(*sequencias)]
+
+
+@lru_cache(maxsize=32)
+def compilar_template(texto):
+    return TemplatePrompt(texto)
+
+
+def ler_e_substituir_template(template_text, dados):
+    # Prompt completo num único texto: instruções fixas seguidas dos dados da pessoa
+    template = compilar_template(template_text)
+    corpo = template.renderizar(dados)
+    return f"{template.instrucoes}\n\n{corpo}" if template.instrucoes else corpo
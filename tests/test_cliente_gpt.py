@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+import cliente_gpt
+from benchmarks.servidor_mock import ServidorMock
+from cache_respostas import CacheRespostas
+from cliente_gpt import TEMPERATURA, LoteCancelado, chamar_gpt
+from telemetria import Telemetria
+
+MODELO = "gpt-4o"
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(cliente_gpt.time, "sleep", lambda segundos: None)
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    servidor = ServidorMock(latencia=0, variacao=0, trechos=10)
+    monkeypatch.setattr(cliente_gpt, "URL_CHAT_COMPLETIONS", servidor.url_base + "/chat/completions")
+    with servidor:
+        yield servidor
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheRespostas(str(tmp_path / "respostas.sqlite3"))
+
+
+def chamar(cache, telemetria, **kwargs):
+    return chamar_gpt("chave", "prompt", MODELO, cache=cache, telemetria=telemetria, stream=True, **kwargs)
+
+
+# ==============================================================================
+# STREAM INCOMPLETO OU COM ERRO
+# ==============================================================================
+@pytest.mark.parametrize("falha", ["truncar", "erro"])
+def test_stream_interrompido_e_reenviado(servidor, cache, falha):
+    servidor.falhas_stream = [falha]
+    telemetria = Telemetria()
+    parciais = []
+
+    resposta = chamar(cache, telemetria, ao_receber=parciais.append)
+
+    assert servidor.requisicoes == 2
+    assert not cliente_gpt.eh_erro(resposta)
+    assert parciais[-1] == resposta
+    assert cache.obter("prompt", MODELO, TEMPERATURA) == resposta
+    contadores = telemetria.resumo()["contadores"]
+    assert contadores["streams_interrompidos"] == 1 and contadores["retentativas"] == 1
+
+
+def test_evento_de_erro_nunca_vira_resposta(servidor, cache):
+    servidor.falhas_stream = ["erro"] * cliente_gpt.MAX_TENTATIVAS
+    telemetria = Telemetria()
+
+    resposta = chamar(cache, telemetria)
+
+    assert servidor.requisicoes == cliente_gpt.MAX_TENTATIVAS
+    assert resposta.startswith("Erro fatal") and "erro no stream" in resposta
+    assert cache.estatisticas()["registros"] == 0
+    assert telemetria.resumo()["contadores"]["falhas"] == 1
+
+
+# ==============================================================================
+# CANCELAMENTO NO MEIO DO STREAM
+# ==============================================================================
+def test_cancelamento_no_meio_do_stream_nao_grava_cache(servidor, cache):
+    cancelar = threading.Event()
+    telemetria = Telemetria()
+    parciais = []
+
+    def receber(texto):
+        parciais.append(texto)
+        cancelar.set()
+
+    with pytest.raises(LoteCancelado):
+        chamar(cache, telemetria, ao_receber=receber, cancelar=cancelar)
+
+    assert len(parciais) == 1 and servidor.requisicoes == 1
+    assert cache.estatisticas()["registros"] == 0
+    assert telemetria.resumo()["contadores"]["streams_cancelados"] == 1
@@ -0,0 +1,293 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol
+
+import planilhas
+from planilhas import (
+    GSheetsServiceAccountClient,
+    _com_retentativas,
+    _dividir_em_chamadas,
+    aplicar_diferencas,
+    calcular_diferencas,
+    gravar_planilha_mestra,
+)
+
+CABECALHO = ["CPF", "Nome", "Idade", "Obs"]
+
+
+# ==============================================================================
+# PLANILHA FALSA (GRAVAÇÃO RAW, LEITURA SEM FORMATAÇÃO)
+# ==============================================================================
+class RespostaErro:
+    def __init__(self, status):
+        self.status_code = status
+        self.text = "erro"
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": "erro", "status": "ERRO"}}
+
+
+class PlanilhaFalsa:
+    def __init__(self, valores=(), linhas=1000):
+        self.row_count = max(linhas, len(valores))
+        self.celulas = {(r, c): v for r, linha in enumerate(valores, start=1) for c, v in enumerate(linha, start=1)}
+        self.chamadas = []
+        self.falhas = []
+
+    def _registrar(self, nome):
+        self.chamadas.append(nome)
+        if self.falhas:
+            raise APIError(RespostaErro(self.falhas.pop(0)))
+
+    def valores(self):
+        if not self.celulas:
+            return [[]]
+        linhas = max(r for r, _ in self.celulas)
+        colunas = max(c for _, c in self.celulas)
+        return [[self.celulas.get((r, c), "") for c in range(1, colunas + 1)] for r in range(1, linhas + 1)]
+
+    def get_all_values(self, **kwargs):
+        self._registrar("get_all_values")
+        return self.valores()
+
+    def resize(self, rows=None, cols=None):
+        self._registrar("resize")
+        self.row_count = rows
+        self.celulas = {k: v for k, v in self.celulas.items() if k[0] <= rows and k[1] <= cols}
+
+    def add_rows(self, quantidade):
+        self._registrar("add_rows")
+        self.row_count += quantidade
+
+    def batch_update(self, dados, **kwargs):
+        self._registrar("batch_update")
+        for intervalo in dados:
+            inicio, fim = intervalo["range"].split(":")
+            linha_inicial, coluna_inicial = a1_to_rowcol(inicio)
+            linha_final, coluna_final = a1_to_rowcol(fim)
+            assert linha_final <= self.row_count, "gravação além do tamanho da planilha"
+            assert len(intervalo["values"]) == linha_final - linha_inicial + 1
+            for i, linha in enumerate(intervalo["values"]):
+                assert len(linha) == coluna_final - coluna_inicial + 1
+                for j, valor in enumerate(linha):
+                    self.celulas[(linha_inicial + i, coluna_inicial + j)] = valor
+
+
+class ClienteFalso(GSheetsServiceAccountClient):
+    def __init__(self, planilha):
+        self.planilha = planilha
+
+    def _select_worksheet(self, **kwargs):
+        return self.planilha
+
+
+class ConexaoFalsa:
+    def __init__(self, planilha):
+        self.client = ClienteFalso(planilha)
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(planilhas.time, "sleep", lambda segundos: None)
+
+
+def df_pessoas(linhas):
+    return pd.DataFrame(linhas, columns=CABECALHO)
+
+
+# ==============================================================================
+# DIFERENÇA POR CPF
+# ==============================================================================
+def test_linhas_iguais_ignoram_int_float_e_vazios():
+    atuais = [CABECALHO, ["12345678901", "Ana", 30, ""], ["00000000191", "Bia", 41.5, "x"]]
+    df = df_pessoas([["12345678901", "Ana", 30.0, np.nan], ["00000000191", "Bia", np.float64(41.5), "x"]])
+
+    diferencas = calcular_diferencas(atuais, df)
+
+    assert not diferencas["reescrever"]
+    assert diferencas["inalteradas"] == 2
+    assert diferencas["atualizar"] == [] and diferencas["inserir"] == []
+
+
+def test_cpf_gravado_como_numero_e_atualizado_e_nao_inserido():
+    # Planilhas gravadas com USER_ENTERED guardam o CPF como número (sem zeros à esquerda)
+    atuais = [CABECALHO, [191, "Bia", 41, ""]]
+    df = df_pessoas([["00000000191", "Bia", 41, None]])
+
+    diferencas = calcular_diferencas(atuais, df)
+
+    assert diferencas["inserir"] == []
+    assert diferencas["atualizar"] == [(2, ["00000000191", "Bia", 41, ""])]
+
+
+def test_atualiza_e_acrescenta_alem_do_tamanho_da_planilha():
+    atuais = [CABECALHO, ["11111111111", "Ana", 30, ""], ["22222222222", "Bia", 40, ""]]
+    planilha = PlanilhaFalsa(atuais, linhas=3)
+    df = df_pessoas([
+        ["11111111111", "Ana", 30, None],
+        ["22222222222", "Bia", 41, "mudou"],
+        ["33333333333", "Caio", 25, None],
+        ["44444444444", "Duda", 52, None],
+    ])
+
+    diferencas = calcular_diferencas(planilha.valores(), df)
+    chamadas = aplicar_diferencas(planilha, diferencas)
+
+    assert [n for n, _ in diferencas["atualizar"]] == [3]
+    assert len(diferencas["inserir"]) == 2 and diferencas["inalteradas"] == 1
+    assert planilha.chamadas == ["add_rows", "batch_update"] and chamadas == 2
+    assert planilha.row_count == 5
+    assert planilha.valores() == [
+        CABECALHO,
+        ["11111111111", "Ana", 30, ""],
+        ["22222222222", "Bia", 41, "mudou"],
+        ["33333333333", "Caio", 25, ""],
+        ["44444444444", "Duda", 52, ""],
+    ]
+
+
+@pytest.mark.parametrize("atuais", [
+    # Cabeçalho diferente
+    [["CPF", "Nome", "Idade"], ["11111111111", "Ana", 30]],
+    # CPF que saiu do quadro
+    [CABECALHO, ["11111111111", "Ana", 30, ""], ["99999999999", "Zeca", 60, ""]],
+    # CPF repetido na planilha
+    [CABECALHO, ["11111111111", "Ana", 30, ""], ["111.111.111-11", "Ana", 30, ""]],
+])
+def test_reescreve_a_planilha_quando_a_diferenca_nao_se_aplica(atuais):
+    planilha = PlanilhaFalsa(atuais, linhas=10)
+    df = df_pessoas([["11111111111", "Ana", 31, None]])
+
+    diferencas = calcular_diferencas(atuais, df)
+    aplicar_diferencas(planilha, diferencas)
+
+    assert diferencas["reescrever"]
+    assert planilha.chamadas[0] == "resize" and planilha.row_count == 2
+    assert planilha.valores() == [CABECALHO, ["11111111111", "Ana", 31, ""]]
+
+
+# ==============================================================================
+# DIVISÃO EM CHAMADAS
+# ==============================================================================
+def test_chamadas_respeitam_max_celulas():
+    largura = len(CABECALHO)
+    linhas = [(n, [f"{n:011d}", "x", n, ""]) for n in list(range(2, 40)) + list(range(50, 53))]
+    intervalos = planilhas._agrupar_intervalos(linhas, largura)
+    assert [i["range"] for i in intervalos] == ["A2:D39", "A50:D52"]
+
+    chamadas = _dividir_em_chamadas(intervalos, largura, max_celulas=40)
+
+    gravadas = []
+    for chamada in chamadas:
+        assert sum(len(i["values"]) * largura for i in chamada) <= 40
+        for intervalo in chamada:
+            inicio, fim = (a1_to_rowcol(p)[0] for p in intervalo["range"].split(":"))
+            assert fim - inicio + 1 == len(intervalo["values"])
+            gravadas.extend(range(inicio, fim + 1))
+    assert gravadas == [n for n, _ in linhas]
+
+
+def test_aplicar_diferencas_divide_as_gravacoes():
+    planilha = PlanilhaFalsa([CABECALHO])
+    df = df_pessoas([[f"{n:011d}", "x", n, None] for n in range(1, 26)])
+
+    diferencas = calcular_diferencas(planilha.valores(), df)
+    chamadas = aplicar_diferencas(planilha, diferencas, max_celulas=10 * len(CABECALHO))
+
+    assert planilha.chamadas.count("batch_update") == 3 and chamadas == 3
+    assert len(planilha.valores()) == 26
+
+
+# ==============================================================================
+# RETENTATIVAS E FLUXO COMPLETO
+# ==============================================================================
+def test_retentativa_em_429_e_erro_definitivo_repassado():
+    planilha = PlanilhaFalsa()
+    planilha.falhas = [429, 503]
+    assert _com_retentativas(planilha.get_all_values) == [[]]
+    assert planilha.chamadas == ["get_all_values"] * 3
+
+    planilha.falhas = [403]
+    with pytest.raises(APIError):
+        _com_retentativas(planilha.get_all_values)
+
+
+def test_gravar_planilha_mestra_so_envia_o_que_mudou():
+    planilha = PlanilhaFalsa()
+    conexao = ConexaoFalsa(planilha)
+    df = df_pessoas([[f"{n:011d}", f"Pessoa {n}", n, None] for n in range(1, 6)])
+
+    primeira = gravar_planilha_mestra(conexao, "planilha", df)
+    assert primeira["reescrita"] and primeira["inseridas"] == 5
+
+    planilha.chamadas.clear()
+    segunda = gravar_planilha_mestra(conexao, "planilha", df)
+    assert segunda == {"inseridas": 0, "atualizadas": 0, "inalteradas": 5, "removidas": 0,
+                       "reescrita": False, "chamadas": 1}
+    assert planilha.chamadas == ["get_all_values"]
+
+    df.loc[2, "Obs"] = "novo"
+    terceira = gravar_planilha_mestra(conexao, "planilha", df)
+    assert (terceira["atualizadas"], terceira["inalteradas"], terceira["chamadas"]) == (1, 4, 2)
+
+
+# ==============================================================================
+# INGESTÃO INCREMENTAL DA ORIGEM
+# ==============================================================================
+class OrigemFalsa:
+    # Imita a API: linhas em branco no meio vêm como [], vazios à direita e linhas finais em branco são omitidos
+    def __init__(self, cabecalho, linhas):
+        self.cabecalho = cabecalho
+        self.linhas = linhas
+        self.row_count = 1000
+
+    def row_values(self, numero):
+        return self.cabecalho if numero == planilhas.LINHA_CABECALHO + 1 else []
+
+    def get(self, intervalo):
+        inicio = a1_to_rowcol(intervalo.split(":")[0])[0] - planilhas.LINHA_CABECALHO - 2
+        valores = [list(linha) for linha in self.linhas[inicio:]]
+        while valores and not valores[-1]:
+            valores.pop()
+        for linha in valores:
+            while linha and linha[-1] == "":
+                linha.pop()
+        return valores
+
+
+def test_ingestao_com_linhas_em_branco_nao_duplica(tmp_path):
+    testes = [[f"teste {n}", "x"] for n in range(planilhas.LINHAS_TESTE)]
+    origem = OrigemFalsa(["CPF", "Nome"], testes + [["111.111.111-11", "Ana"], [], ["222.222.222-22", ""]])
+    conexao = ConexaoFalsa(origem)
+    caminhos = {"caminho_estado": str(tmp_path / "estado.json"), "caminho_snapshot": str(tmp_path / "snap.pkl")}
+
+    def ler(inicio):
+        return planilhas.ler_origem_a_partir_de(conexao, "origem", inicio)
+
+    df, novas = planilhas.ingerir_origem(ler, **caminhos)
+    assert list(df["CPF"]) == ["111.111.111-11", "222.222.222-22"] and novas == 2
+    assert planilhas.carregar_estado_ingestao(caminhos["caminho_estado"])["linhas_lidas"] == planilhas.LINHAS_TESTE + 3
+
+    origem.linhas.append(["333.333.333-33", "Caio"])
+    df, novas = planilhas.ingerir_origem(ler, **caminhos)
+    assert list(df["CPF"]) == ["111.111.111-11", "222.222.222-22", "333.333.333-33"] and novas == 1
+
+    df, novas = planilhas.ingerir_origem(ler, **caminhos)
+    assert len(df) == 3 and novas == 0
+
+
+def test_gravacao_atomica_usa_permissao_padrao(tmp_path):
+    caminho = str(tmp_path / "estado.json")
+
+    def gravar(temporario):
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write("{}")
+
+    planilhas._gravar_atomico(caminho, gravar)
+
+    assert os.stat(caminho).st_mode & 0o777 == planilhas.MODO_ARQUIVO
+    assert os.listdir(tmp_path) == ["estado.json"]
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import cliente_gpt
+import trabalhos
+from benchmarks.servidor_mock import ServidorMock
+from cache_respostas import CacheRespostas
+from trabalhos import CONCLUIDO, EM_ANDAMENTO, FALHOU, FINALIZADO, PENDENTE, DiarioTrabalhos
+
+
+@pytest.fixture
+def diario(tmp_path):
+    return DiarioTrabalhos(str(tmp_path / "trabalhos.sqlite3"))
+
+
+def prompts(quantidade):
+    return [{"id": i, "nome": f"Pessoa {i}", "nome_arquivo": f"Pessoa_{i}", "conteudo": f"dados {i}",
+             "instrucoes": "instruções"} for i in range(quantidade)]
+
+
+def estados(diario, trabalho_id):
+    with sqlite3.connect(diario.caminho) as conn:
+        return dict(conn.execute("SELECT registro_id, estado FROM registros WHERE trabalho_id = ?", (trabalho_id,)))
+
+
+# ==============================================================================
+# ESTADOS DOS REGISTROS
+# ==============================================================================
+def test_ciclo_de_estados_dos_registros(diario):
+    trabalho_id = diario.criar_trabalho(prompts(4), "gpt-4o")
+    assert set(estados(diario, trabalho_id).values()) == {PENDENTE}
+    assert diario.pendentes(trabalho_id)[0] == prompts(1)[0]
+
+    for registro_id in range(3):
+        diario.marcar_em_andamento(trabalho_id, registro_id)
+    diario.gravar_resultado(trabalho_id, {"id": 0, "nome": "Pessoa 0"}, "# Relatório", b"docx")
+    registro = diario.gravar_resultado(trabalho_id, {"id": 1, "nome": "Pessoa 1"}, "Erro na API (HTTP 500): x", None)
+
+    assert registro == {"id": 1, "nome": "Pessoa 1", "erro": True}
+    assert estados(diario, trabalho_id) == {0: CONCLUIDO, 1: FALHOU, 2: EM_ANDAMENTO, 3: PENDENTE}
+    assert diario.ler_resposta(trabalho_id, 0) == "# Relatório"
+    assert diario.ler_resposta(trabalho_id, 1).startswith("Erro na API")
+
+    # Queda do processo: o que estava na API volta para a fila; concluídos e falhas ficam como estão
+    diario.reabrir_interrompidos(trabalho_id)
+    assert estados(diario, trabalho_id) == {0: CONCLUIDO, 1: FALHOU, 2: PENDENTE, 3: PENDENTE}
+
+    diario.reenfileirar_falhas(trabalho_id)
+    assert estados(diario, trabalho_id) == {0: CONCLUIDO, 1: PENDENTE, 2: PENDENTE, 3: PENDENTE}
+    assert [p["id"] for p in diario.pendentes(trabalho_id)] == [1, 2, 3]
+    assert diario.contagens(trabalho_id) == {PENDENTE: 3, EM_ANDAMENTO: 0, CONCLUIDO: 1, FALHOU: 0, "total": 4}
+
+
+# ==============================================================================
+# RETENÇÃO
+# ==============================================================================
+def test_remover_antigos_preserva_lote_em_execucao(diario, monkeypatch):
+    antigo, rodando, recente = (diario.criar_trabalho(prompts(2), "gpt-4o") for _ in range(3))
+    with sqlite3.connect(diario.caminho) as conn:
+        conn.execute("UPDATE trabalhos SET atualizado_em = ? WHERE id IN (?, ?)",
+                     (time.time() - diario.retencao - 1, antigo, rodando))
+
+    liberar = threading.Event()
+    thread = threading.Thread(target=liberar.wait, daemon=True)
+    thread.start()
+    monkeypatch.setitem(trabalhos._execucoes, rodando, thread)
+    try:
+        assert diario.remover_antigos() == 1
+    finally:
+        liberar.set()
+        thread.join()
+
+    assert diario.trabalho(antigo) is None and estados(diario, antigo) == {}
+    assert diario.trabalho(rodando) is not None and diario.contagens(rodando)["total"] == 2
+    assert diario.trabalho(recente) is not None
+
+
+# ==============================================================================
+# EXECUÇÃO EM SEGUNDO PLANO
+# ==============================================================================
+def test_lote_em_segundo_plano_conclui_os_pendentes(diario, tmp_path, monkeypatch):
+    with ServidorMock(latencia=0, variacao=0) as servidor:
+        monkeypatch.setattr(cliente_gpt, "URL_CHAT_COMPLETIONS", servidor.url_base + "/chat/completions")
+        trabalho_id = diario.criar_trabalho(prompts(3), "gpt-4o")
+        diario.marcar_em_andamento(trabalho_id, 0)
+
+        assert trabalhos.iniciar_trabalho(diario, trabalho_id, "chave", processos=0,
+                                          cache=CacheRespostas(str(tmp_path / "respostas.sqlite3")))
+        trabalhos._execucoes[trabalho_id].join(timeout=30)
+
+    assert diario.trabalho(trabalho_id)["situacao"] == FINALIZADO
+    assert set(estados(diario, trabalho_id).values()) == {CONCLUIDO}
+    assert servidor.requisicoes == 3
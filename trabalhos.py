@@ -0,0 +1,328 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from cliente_gpt import eh_erro
+from motor import executar_lote
+from saida_lote import ZipIncremental
+
+CAMINHO_DIARIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "trabalhos.sqlite3")
+
+# Estados de cada registro do lote
+PENDENTE = "pendente"
+EM_ANDAMENTO = "em_andamento"
+CONCLUIDO = "concluido"
+FALHOU = "falhou"
+
+# Situação do lote
+EXECUTANDO = "executando"
+FINALIZADO = "finalizado"
+INTERROMPIDO = "interrompido"
+CANCELADO = "cancelado"
+
+# Lotes sem atividade há mais tempo que isso são apagados do diário (prompts, respostas e DOCX)
+RETENCAO_DIAS_PADRAO = 30
+
+
+# ==============================================================================
+# DIÁRIO PERSISTENTE DE LOTES (SQLITE)
+# ==============================================================================
+class DiarioTrabalhos:
+    # Guarda prompts, estado, resposta e DOCX de cada registro: um lote sobrevive ao fechamento
+    # da aba e ao reinício do servidor e pode ser retomado de onde parou. A limpeza dos lotes antigos
+    # (`retencao_dias`) roda a cada lote criado.
+    def __init__(self, caminho=CAMINHO_DIARIO_PADRAO, retencao_dias=RETENCAO_DIAS_PADRAO):
+        self.caminho = caminho
+        self.retencao = retencao_dias * 86400 if retencao_dias else None
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS trabalhos ("
+                " id TEXT PRIMARY KEY,"
+                " modelo TEXT NOT NULL,"
+                " instrucoes TEXT,"
+                " situacao TEXT NOT NULL,"
+                " erro TEXT,"
+                " criado_em REAL NOT NULL,"
+                " atualizado_em REAL NOT NULL)"
+            )
+            # Diários criados antes da separação das instruções fixas
+            colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(trabalhos)")}
+            if "instrucoes" not in colunas:
+                conn.execute("ALTER TABLE trabalhos ADD COLUMN instrucoes TEXT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS registros ("
+                " trabalho_id TEXT NOT NULL,"
+                " registro_id INTEGER NOT NULL,"
+                " nome TEXT NOT NULL,"
+                " nome_arquivo TEXT NOT NULL,"
+                " conteudo TEXT NOT NULL,"
+                " estado TEXT NOT NULL,"
+                " resposta TEXT,"
+                " erro TEXT,"
+                " docx BLOB,"
+                " tentativas INTEGER NOT NULL DEFAULT 0,"
+                " atualizado_em REAL NOT NULL,"
+                " PRIMARY KEY (trabalho_id, registro_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_registros_estado ON registros (trabalho_id, estado)")
+
+    def _conectar(self):
+        # Conexão curta por operação: o diário é usado pela thread do lote e pelas threads do despachante
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def criar_trabalho(self, prompts, modelo):
+        self.remover_antigos()
+        trabalho_id = uuid.uuid4().hex[:12]
+        agora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT INTO trabalhos (id, modelo, instrucoes, situacao, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (trabalho_id, modelo, prompts[0].get('instrucoes') if prompts else None, INTERROMPIDO, agora, agora),
+            )
+            conn.executemany(
+                "INSERT INTO registros (trabalho_id, registro_id, nome, nome_arquivo, conteudo, estado, atualizado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(trabalho_id, int(p['id']), p['nome'], p['nome_arquivo'], p['conteudo'], PENDENTE, agora) for p in prompts],
+            )
+        return trabalho_id
+
+    def excluir_trabalho(self, trabalho_id):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM registros WHERE trabalho_id = ?", (trabalho_id,))
+            conn.execute("DELETE FROM trabalhos WHERE id = ?", (trabalho_id,))
+
+    def remover_antigos(self):
+        # Retorna a quantidade de lotes apagados; os que estão rodando neste processo são preservados
+        if not self.retencao:
+            return 0
+        with self._conectar() as conn:
+            ids = [l[0] for l in conn.execute("SELECT id FROM trabalhos WHERE atualizado_em < ?",
+                                              (time.time() - self.retencao,))]
+        ids = [i for i in ids if not em_execucao(i)]
+        for trabalho_id in ids:
+            self.excluir_trabalho(trabalho_id)
+        return len(ids)
+
+    def trabalho(self, trabalho_id):
+        with self._conectar() as conn:
+            linha = conn.execute("SELECT id, modelo, situacao, erro, criado_em FROM trabalhos WHERE id = ?",
+                                 (trabalho_id,)).fetchone()
+        if linha is None:
+            return None
+        return dict(zip(("id", "modelo", "situacao", "erro", "criado_em"), linha))
+
+    def listar_trabalhos(self, limite=20):
+        with self._conectar() as conn:
+            ids = [l[0] for l in conn.execute("SELECT id FROM trabalhos ORDER BY criado_em DESC LIMIT ?", (limite,))]
+        return [self.trabalho(i) for i in ids]
+
+    def definir_situacao(self, trabalho_id, situacao, erro=None):
+        with self._conectar() as conn:
+            conn.execute("UPDATE trabalhos SET situacao = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+                         (situacao, erro, time.time(), trabalho_id))
+
+    def contagens(self, trabalho_id):
+        contagens = dict.fromkeys((PENDENTE, EM_ANDAMENTO, CONCLUIDO, FALHOU), 0)
+        with self._conectar() as conn:
+            for estado, qtd in conn.execute(
+                "SELECT estado, COUNT(*) FROM registros WHERE trabalho_id = ? GROUP BY estado", (trabalho_id,)
+            ):
+                contagens[estado] = qtd
+        contagens["total"] = sum(contagens.values())
+        return contagens
+
+    def pendentes(self, trabalho_id):
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                "SELECT r.registro_id, r.nome, r.nome_arquivo, r.conteudo, t.instrucoes"
+                " FROM registros r JOIN trabalhos t ON t.id = r.trabalho_id"
+                " WHERE r.trabalho_id = ? AND r.estado = ? ORDER BY r.registro_id",
+                (trabalho_id, PENDENTE),
+            ).fetchall()
+        return [dict(zip(("id", "nome", "nome_arquivo", "conteudo", "instrucoes"), l)) for l in linhas]
+
+    def _mudar_estado(self, trabalho_id, de, para):
+        with self._conectar() as conn:
+            conn.execute("UPDATE registros SET estado = ?, atualizado_em = ? WHERE trabalho_id = ? AND estado = ?",
+                         (para, time.time(), trabalho_id, de))
+
+    def reabrir_interrompidos(self, trabalho_id):
+        # Registros que estavam na API quando o processo caiu voltam para a fila
+        self._mudar_estado(trabalho_id, EM_ANDAMENTO, PENDENTE)
+
+    def reenfileirar_falhas(self, trabalho_id):
+        self._mudar_estado(trabalho_id, FALHOU, PENDENTE)
+
+    def marcar_em_andamento(self, trabalho_id, registro_id):
+        with self._conectar() as conn:
+            conn.execute(
+                "UPDATE registros SET estado = ?, tentativas = tentativas + 1, atualizado_em = ?"
+                " WHERE trabalho_id = ? AND registro_id = ?",
+                (EM_ANDAMENTO, time.time(), trabalho_id, int(registro_id)),
+            )
+
+    def gravar_resultado(self, trabalho_id, item, resposta, docx_bytes):
+        falhou = eh_erro(resposta)
+        with self._conectar() as conn:
+            conn.execute(
+                "UPDATE registros SET estado = ?, resposta = ?, erro = ?, docx = ?, atualizado_em = ?"
+                " WHERE trabalho_id = ? AND registro_id = ?",
+                (FALHOU if falhou else CONCLUIDO, None if falhou else resposta, resposta if falhou else None,
+                 None if falhou else docx_bytes, time.time(), trabalho_id, int(item['id'])),
+            )
+        return {"id": item['id'], "nome": item['nome'], "erro": falhou}
+
+    def _filtro_registros(self, trabalho_id, estados, busca):
+        condicao = f"trabalho_id = ? AND estado IN ({', '.join('?' * len(estados))})"
+        parametros = [trabalho_id, *estados]
+        if busca:
+            condicao += " AND nome LIKE ? ESCAPE '\\'"
+            termo = busca.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parametros.append(f"%{termo}%")
+        return condicao, parametros
+
+    def contar_registros(self, trabalho_id, estados=(CONCLUIDO, FALHOU), busca=None):
+        condicao, parametros = self._filtro_registros(trabalho_id, estados, busca)
+        with self._conectar() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM registros WHERE {condicao}", parametros).fetchone()[0]
+
+    def registros(self, trabalho_id, estados=(CONCLUIDO, FALHOU), busca=None, limite=None, deslocamento=0):
+        # Paginação no SQL: a revisão carrega só a página exibida, qualquer que seja o tamanho do lote
+        condicao, parametros = self._filtro_registros(trabalho_id, estados, busca)
+        with self._conectar() as conn:
+            linhas = conn.execute(
+                f"SELECT registro_id, nome, estado FROM registros WHERE {condicao} ORDER BY registro_id LIMIT ? OFFSET ?",
+                (*parametros, -1 if limite is None else limite, deslocamento),
+            ).fetchall()
+        return [{"id": i, "nome": nome, "erro": estado == FALHOU} for i, nome, estado in linhas]
+
+    def ler_resposta(self, trabalho_id, registro_id):
+        with self._conectar() as conn:
+            linha = conn.execute("SELECT COALESCE(resposta, erro, '') FROM registros WHERE trabalho_id = ? AND registro_id = ?",
+                                 (trabalho_id, int(registro_id))).fetchone()
+        return linha[0] if linha else ""
+
+    def exportar_zip(self, trabalho_id):
+        # DOCX dos registros concluídos até agora (serve para download parcial durante o lote)
+        zip_saida = ZipIncremental()
+        with self._conectar() as conn:
+            for nome_arquivo, docx in conn.execute(
+                "SELECT nome_arquivo, docx FROM registros WHERE trabalho_id = ? AND estado = ? ORDER BY registro_id",
+                (trabalho_id, CONCLUIDO),
+            ):
+                zip_saida.adicionar(f"RESPOSTA_{nome_arquivo}.docx", docx)
+        zip_saida.fechar()
+        return zip_saida.ler_bytes()
+
+
+class _ArmazemDiario:
+    # Interface de armazém esperada por executar_lote
+    def __init__(self, diario, trabalho_id):
+        self.diario = diario
+        self.trabalho_id = trabalho_id
+
+    def gravar(self, item, resposta, docx_bytes):
+        registro = self.diario.gravar_resultado(self.trabalho_id, item, resposta, docx_bytes)
+        with _lock_execucoes:
+            _parciais.get(self.trabalho_id, {}).pop(item['id'], None)
+        return registro
+
+
+# ==============================================================================
+# EXECUÇÃO EM SEGUNDO PLANO
+# ==============================================================================
+_execucoes = {}
+_cancelamentos = {}
+# Texto parcial (streaming) dos registros em geração: {trabalho_id: {registro_id: {"nome", "texto"}}}
+_parciais = {}
+_lock_execucoes = threading.Lock()
+
+
+def _thread_viva(trabalho_id):
+    thread = _execucoes.get(trabalho_id)
+    return thread is not None and thread.is_alive()
+
+
+def em_execucao(trabalho_id):
+    with _lock_execucoes:
+        return _thread_viva(trabalho_id)
+
+
+def cancelar_trabalho(trabalho_id):
+    # Os registros já concluídos ficam no diário; os demais voltam para a fila ao fim da thread
+    with _lock_execucoes:
+        evento = _cancelamentos.get(trabalho_id)
+        if evento is None or not _thread_viva(trabalho_id):
+            return False
+        evento.set()
+    return True
+
+
+def cancelamento_solicitado(trabalho_id):
+    with _lock_execucoes:
+        evento = _cancelamentos.get(trabalho_id)
+        return evento is not None and evento.is_set() and _thread_viva(trabalho_id)
+
+
+def respostas_parciais(trabalho_id):
+    with _lock_execucoes:
+        return [{"id": i, **p} for i, p in sorted(_parciais.get(trabalho_id, {}).items())]
+
+
+def _receber_parcial(trabalho_id, item, texto):
+    with _lock_execucoes:
+        _parciais.setdefault(trabalho_id, {})[item['id']] = {"nome": item['nome'], "texto": texto}
+
+
+def situacao_atual(trabalho):
+    # "executando" sem thread viva neste processo = servidor reiniciado no meio do lote
+    if trabalho['situacao'] == EXECUTANDO and not em_execucao(trabalho['id']):
+        return INTERROMPIDO
+    return trabalho['situacao']
+
+
+def _executar_trabalho(diario, trabalho_id, api_key, opcoes_lote, cancelar):
+    try:
+        trabalho = diario.trabalho(trabalho_id)
+        executar_lote(
+            api_key,
+            diario.pendentes(trabalho_id),
+            _ArmazemDiario(diario, trabalho_id),
+            modelo=trabalho['modelo'],
+            ao_iniciar=lambda item: diario.marcar_em_andamento(trabalho_id, item['id']),
+            ao_receber=lambda item, texto: _receber_parcial(trabalho_id, item, texto),
+            cancelar=cancelar,
+            **opcoes_lote,
+        )
+        if cancelar.is_set():
+            diario.reabrir_interrompidos(trabalho_id)
+            diario.definir_situacao(trabalho_id, CANCELADO)
+        else:
+            diario.definir_situacao(trabalho_id, FINALIZADO)
+    except Exception as e:
+        diario.reabrir_interrompidos(trabalho_id)
+        diario.definir_situacao(trabalho_id, INTERROMPIDO, str(e))
+    finally:
+        with _lock_execucoes:
+            _parciais.pop(trabalho_id, None)
+
+
+def iniciar_trabalho(diario, trabalho_id, api_key, **opcoes_lote):
+    # Processa os registros pendentes numa thread própria, independente da execução do script
+    # Streamlit; `opcoes_lote` segue para executar_lote. Retorna False se o lote já estiver rodando.
+    with _lock_execucoes:
+        if _thread_viva(trabalho_id):
+            return False
+        diario.reabrir_interrompidos(trabalho_id)
+        diario.definir_situacao(trabalho_id, EXECUTANDO)
+        cancelar = threading.Event()
+        thread = threading.Thread(target=_executar_trabalho, args=(diario, trabalho_id, api_key, opcoes_lote, cancelar),
+                                  name=f"lote-{trabalho_id}", daemon=True)
+        _execucoes[trabalho_id] = thread
+        _cancelamentos[trabalho_id] = cancelar
+        thread.start()
+    return True
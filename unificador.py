@@ -0,0 +1,54 @@
+import pandas as pd
+
+NOME_COLUNA_CORTE = "Pergunta"
+
+# Layout da planilha de origem: cabeçalho na linha 7 (header=6) e 7 linhas de teste logo abaixo
+LINHA_CABECALHO = 6
+LINHAS_TESTE = 7
+
+
+def normalizar_cpf(serie):
+    # Aceita "123.456.789-01", "12345678901" e CPFs lidos como número (12345678901.0, zeros à esquerda perdidos)
+    texto = serie.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    digitos = texto.str.replace(r"\D", "", regex=True)
+    return digitos.str.zfill(11).where(digitos.str.len() > 0)
+
+
+# ==============================================================================
+# UNIFICAÇÃO DE SUBMISSÕES POR CPF
+# ==============================================================================
+def processar_cpfs(df):
+    df = df.dropna(how='all', axis=1)
+    df.columns = [str(c).strip() for c in df.columns]
+
+    if 'CPF' not in df.columns:
+        raise ValueError("Coluna 'CPF' não encontrada na origem.")
+    if NOME_COLUNA_CORTE not in df.columns:
+        raise ValueError(f"Coluna '{NOME_COLUNA_CORTE}' não encontrada.")
+
+    idx_corte = df.columns.get_loc(NOME_COLUNA_CORTE)
+    colunas_extras = list(df.columns[idx_corte:])
+
+    cpf = normalizar_cpf(df['CPF'])
+    df = df.assign(CPF=cpf)[cpf.notna()]
+
+    # 0 = primeira submissão do CPF, 1 = segunda, ...
+    ordem = df.groupby('CPF', sort=False).cumcount()
+    resultado = df[ordem == 0].set_index('CPF')
+
+    repetidas = ordem > 0
+    if repetidas.any():
+        extras = df.loc[repetidas, ['CPF'] + colunas_extras]
+        extras = extras.set_index(['CPF', ordem[repetidas] + 1])
+        largo = extras.unstack(level=1)
+
+        # Mesma ordem de antes: todas as colunas "_2", depois todas as "_3", ...
+        submissoes = sorted(largo.columns.get_level_values(1).unique())
+        largo = largo.reindex(columns=pd.MultiIndex.from_tuples(
+            [(col, n) for n in submissoes for col in colunas_extras]
+        ))
+        largo.columns = [f"{col}_{n}" for col, n in largo.columns]
+        resultado = resultado.join(largo)
+
+    resultado = resultado.reset_index()
+    return resultado[list(df.columns) + [c for c in resultado.columns if c not in df.columns]]